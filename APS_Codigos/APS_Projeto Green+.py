@@ -1,7 +1,13 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, scrolledtext
 import csv, os, hashlib, datetime, random, math
+import re, bisect, unicodedata, sys, zlib, json, threading, atexit, time, shutil
+import multiprocessing, uuid, urllib.request, urllib.parse, queue
+from concurrent.futures import Future
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from enum import Enum
 from tkcalendar import Calendar
+import numpy as np
 from matplotlib.figure import Figure
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 
@@ -9,100 +15,440 @@ from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 
 # -------------- Config / Arquivos ----------------
 DATA_DIR = "data"
-USER_FILE = os.path.join(DATA_DIR, "users.csv")
-PROGRESS_FILE = os.path.join(DATA_DIR, "progresso.csv")
+USER_FILE = os.path.join(DATA_DIR, "users.csv")  # formato antigo (arquivo único); migrado para SHARDS_DIR
+PROGRESS_FILE = os.path.join(DATA_DIR, "progresso.csv")  # idem
+SHARDS_DIR = os.path.join(DATA_DIR, "shards")  # users/progresso particionados por hash do email
+SHARDS_CONFIG_FILE = os.path.join(SHARDS_DIR, "config.json")
+SHARDS_LOCK_FILE = os.path.join(SHARDS_DIR, "resharding.lock")  # existe enquanto o resharding bloqueia escritas
+SHARDS_PADRAO = 4
 TASKS_FILE = os.path.join(DATA_DIR, "tarefas.csv")
 REWARDS_FILE = os.path.join(DATA_DIR, "recompensas.csv")  # novo arquivo para recompensas
+REDEMPTIONS_FILE = os.path.join(DATA_DIR, "resgates.csv")  # registro de todos os pedidos de resgate (estoque/limites)
+ACHIEVEMENTS_FILE = os.path.join(DATA_DIR, "conquistas.csv")  # regras das conquistas (badges)
+GROUPS_FILE = os.path.join(DATA_DIR, "grupos.csv")  # participação em grupos (escola, turma, empresa)
+TIPOS_GRUPO = ("escola", "turma", "empresa")
+SEARCH_INDEX_FILE = os.path.join(DATA_DIR, "indice_relatorios.csv")  # índice invertido dos relatórios
+MODERATORS_FILE = os.path.join(DATA_DIR, "moderadores.csv")  # emails com acesso às telas de moderação
+FLAGS_FILE = os.path.join(DATA_DIR, "relatorios_sinalizados.csv")  # saída da análise de relatórios suspeitos
+ANALYTICS_DIR = os.path.join(DATA_DIR, "analytics")  # relatórios administrativos exportados
+ANALYTICS_CACHE_DIR = os.path.join(ANALYTICS_DIR, "cache")  # agregados por mês já calculados
+LOGIN_JOURNAL_FILE = os.path.join(DATA_DIR, "logins_pendentes.log")  # logins ainda não gravados em users.csv
+CHANGELOG_FILE = os.path.join(DATA_DIR, "alteracoes.jsonl")  # alterações locais, na ordem em que aconteceram
+SYNC_STATE_FILE = os.path.join(DATA_DIR, "sync.json")  # id desta máquina, servidor e cursores de sincronização
+SNAPSHOTS_DIR = os.path.join(DATA_DIR, "snapshots")  # cópias incrementais de data/ (blocos comprimidos + manifestos)
 
 os.makedirs(DATA_DIR, exist_ok=True)
 
-# cria csvs iniciais se não existirem (mesma lógica original)
-if not os.path.exists(USER_FILE):
-    with open(USER_FILE, "w", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        # adicionamos a coluna 'rewards' para registrar recompensas resgatadas pelo usuário
-        writer.writerow(["email", "senha", "nome", "pontos", "nivel", "ultimo_login", "badges", "rewards"])
-
-if not os.path.exists(PROGRESS_FILE):
-    with open(PROGRESS_FILE, "w", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        writer.writerow(["email", "data", "tarefa", "pontos", "relatorio"])
+# colunas dos arquivos de usuários e de progresso (cada shard tem o mesmo cabeçalho)
+# adicionamos a coluna 'rewards' para registrar recompensas resgatadas pelo usuário
+COLUNAS_USUARIOS = ["email", "senha", "nome", "pontos", "nivel", "ultimo_login", "badges", "rewards"]
+COLUNAS_PROGRESSO = ["email", "data", "tarefa", "pontos", "relatorio"]
+
+# categoria das tarefas conhecidas, usada para migrar tarefas.csv antigo (sem a coluna categoria)
+CATEGORIAS_TAREFAS = {
+    "Coleta Seletiva": "Resíduos",
+    "Consumo Consciente": "Resíduos",
+    "Redução de Resíduos": "Resíduos",
+    "Compostagem": "Resíduos",
+    "Economia de Água": "Água",
+    "Economia de Energia": "Energia",
+    "Transporte Sustentável": "Energia",
+    "Redução de Carbono": "Energia",
+    "Horta Caseira": "Cultivo",
+    "Atividade Comunitária": "Comunidade",
+    "Educação Ambiental": "Comunidade",
+    "Projeto de Impacto": "Comunidade",
+}
 
+# cria csvs iniciais se não existirem (mesma lógica original)
 if not os.path.exists(TASKS_FILE):
     with open(TASKS_FILE, "w", newline="", encoding="utf-8") as f:
         writer = csv.writer(f)
-        writer.writerow(["nivel", "tarefa", "descricao", "pontos_minimo", "pontos_maximo"])
+        writer.writerow(["nivel", "tarefa", "descricao", "pontos_minimo", "pontos_maximo", "categoria"])
         default_tasks = [
-            ["Básico", "Coleta Seletiva", "Separe papel, plástico, metal e vidro corretamente.", 8, 20],
-            ["Básico", "Economia de Água", "Faça um banho de até 10 minutos.", 8, 20],
-            ["Básico", "Economia de Energia", "Desligue eletrodomésticos não usados por 24h.", 8, 20],
-            ["Intermediário", "Horta Caseira", "Plante uma muda e registre o crescimento.", 10, 20],
-            ["Intermediário", "Compostagem", "Inicie compostagem de restos orgânicos.", 10, 20],
-            ["Avançado", "Projeto de Impacto", "Crie um projeto sustentável na comunidade.", 10, 25],
+            ["Básico", "Coleta Seletiva", "Separe papel, plástico, metal e vidro corretamente.", 8, 20, "Resíduos"],
+            ["Básico", "Economia de Água", "Faça um banho de até 10 minutos.", 8, 20, "Água"],
+            ["Básico", "Economia de Energia", "Desligue eletrodomésticos não usados por 24h.", 8, 20, "Energia"],
+            ["Intermediário", "Horta Caseira", "Plante uma muda e registre o crescimento.", 10, 20, "Cultivo"],
+            ["Intermediário", "Compostagem", "Inicie compostagem de restos orgânicos.", 10, 20, "Resíduos"],
+            ["Avançado", "Projeto de Impacto", "Crie um projeto sustentável na comunidade.", 10, 25, "Comunidade"],
         ]
         writer.writerows(default_tasks)
+else:
+    with open(TASKS_FILE, "r", newline="", encoding="utf-8") as f:
+        linhas = [l for l in csv.reader(f) if l]
+    if linhas and "categoria" not in linhas[0]:
+        col_tarefa = linhas[0].index("tarefa")
+        with open(TASKS_FILE, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(linhas[0] + ["categoria"])
+            writer.writerows(l + [CATEGORIAS_TAREFAS.get(l[col_tarefa], "Geral")] for l in linhas[1:])
+
+# regras das conquistas. tipo: nivel (parametro = nível), sequencia (alvo = dias seguidos com tarefa),
+# contagem (alvo = total de tarefas) ou categoria (alvo = tarefas da categoria em parametro)
+if not os.path.exists(ACHIEVEMENTS_FILE):
+    with open(ACHIEVEMENTS_FILE, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["id", "titulo", "tipo", "alvo", "parametro"])
+        default_achievements = [
+            ["NIVEL_BASICO", "🌱 Consciente", "nivel", "", "Básico"],
+            ["NIVEL_INTER", "♻️ Engajado", "nivel", "", "Intermediário"],
+            ["NIVEL_AVANC", "🌍 Sustentável", "nivel", "", "Avançado"],
+            ["SEQ_3", "🔥 3 dias seguidos", "sequencia", 3, ""],
+            ["SEQ_7", "🔥 7 dias seguidos", "sequencia", 7, ""],
+            ["SEQ_30", "🏅 30 dias seguidos", "sequencia", 30, ""],
+            ["TAREFAS_10", "✅ 10 tarefas", "contagem", 10, ""],
+            ["TAREFAS_50", "✅ 50 tarefas", "contagem", 50, ""],
+            ["TAREFAS_100", "🏆 100 tarefas", "contagem", 100, ""],
+            ["CAT_RESIDUOS", "🗑️ Mestre da Reciclagem", "categoria", 10, "Resíduos"],
+            ["CAT_AGUA", "💧 Guardião da Água", "categoria", 10, "Água"],
+            ["CAT_ENERGIA", "⚡ Poupador de Energia", "categoria", 10, "Energia"],
+            ["CAT_CULTIVO", "🌿 Mão Verde", "categoria", 10, "Cultivo"],
+        ]
+        writer.writerows(default_achievements)
 
 # cria arquivo de recompensas padrão se não existir
 if not os.path.exists(REWARDS_FILE):
     with open(REWARDS_FILE, "w", newline="", encoding="utf-8") as f:
         writer = csv.writer(f)
-        # colunas: id, nivel, titulo, descricao, custo_pontos
-        writer.writerow(["id", "nivel", "titulo", "descricao", "custo_pontos"])
+        # colunas: id, nivel, titulo, descricao, custo_pontos, estoque, limite_periodo, periodo
+        # (estoque/limite vazios = sem limite; periodo = dia, semana ou mes)
+        writer.writerow(["id", "nivel", "titulo", "descricao", "custo_pontos", "estoque", "limite_periodo", "periodo"])
         default_rewards = [
-            ["R_BASIC_01", "Básico", "Garrafa Ecológica Virtual", "Um troféu virtual e destaque no perfil - celebra seu comprometimento inicial.", "50"],
-            ["R_BASIC_02", "Básico", "Kit Dicas Sustentáveis", "Guia com 10 dicas práticas para economia de água e energia.", "40"],
-            ["R_INTER_01", "Intermediário", "Certificado de Ação Sustentável", "Certificado digital que pode ser compartilhado em redes sociais.", "150"],
-            ["R_INTER_02", "Intermediário", "Adesivo 'Engajado' Virtual", "Selo visual especial para o perfil e ranking.", "120"],
-            ["R_ADV_01", "Avançado", "Embaixador Verde", "Título especial que aparece no topo do ranking e distinção no perfil.", "300"],
-            ["R_ADV_02", "Avançado", "Workshop Online (Simulado)", "Convite simbólico para workshop temático (simulação interna).", "350"],
+            ["R_BASIC_01", "Básico", "Garrafa Ecológica Virtual", "Um troféu virtual e destaque no perfil - celebra seu comprometimento inicial.", "50", "", "", ""],
+            ["R_BASIC_02", "Básico", "Kit Dicas Sustentáveis", "Guia com 10 dicas práticas para economia de água e energia.", "40", "", "", ""],
+            ["R_INTER_01", "Intermediário", "Certificado de Ação Sustentável", "Certificado digital que pode ser compartilhado em redes sociais.", "150", "", "", ""],
+            ["R_INTER_02", "Intermediário", "Adesivo 'Engajado' Virtual", "Selo visual especial para o perfil e ranking.", "120", "", "", ""],
+            ["R_ADV_01", "Avançado", "Embaixador Verde", "Título especial que aparece no topo do ranking e distinção no perfil.", "300", "50", "10", "semana"],
+            ["R_ADV_02", "Avançado", "Workshop Online (Simulado)", "Convite simbólico para workshop temático (simulação interna).", "350", "30", "", ""],
         ]
         writer.writerows(default_rewards)
 
+if not os.path.exists(MODERATORS_FILE):
+    with open(MODERATORS_FILE, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["email"])
+
 # ------------------ Utils -------------------------
 def md5(text: str) -> str:
     return hashlib.md5(text.encode("utf-8")).hexdigest()
 
-def carregar_usuarios():
+# trava para leitura-alteração-gravação de users.csv (a gravação de logins roda em outra thread)
+_USERS_LOCK = threading.RLock()
+
+# -------- Armazenamento particionado (shards) ----------
+# Usuários e progresso ficam em N arquivos cada, escolhidos pelo hash do email:
+# data/shards/g<geração>/users_XX.csv e progresso_XX.csv. Escritas de usuários diferentes
+# caem em arquivos diferentes e a leitura dos dados de um usuário abre só o shard dele.
+# Um registro de progresso é identificado por (shard << 40) | offset em bytes no arquivo do shard.
+_ID_BITS = 40
+_config_cache = {"mtime": None, "config": None}
+
+def _config_shards():
+    mtime = os.path.getmtime(SHARDS_CONFIG_FILE)
+    if _config_cache["mtime"] != mtime:
+        with open(SHARDS_CONFIG_FILE, "r", encoding="utf-8") as f:
+            _config_cache["config"] = json.load(f)
+        _config_cache["mtime"] = mtime
+    return _config_cache["config"]
+
+def _gravar_config_shards(config):
+    tmp = SHARDS_CONFIG_FILE + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(config, f)
+    os.replace(tmp, SHARDS_CONFIG_FILE)
+
+def _pasta_geracao(geracao):
+    return os.path.join(SHARDS_DIR, f"g{geracao}")
+
+def shard_de(email, n=None):
+    if n is None:
+        n = _config_shards()["n"]
+    return zlib.crc32(email.strip().lower().encode("utf-8")) % n
+
+def arquivo_usuarios_shard(shard, config=None):
+    config = config or _config_shards()
+    return os.path.join(_pasta_geracao(config["geracao"]), f"users_{shard:02d}.csv")
+
+def arquivo_progresso_shard(shard, config=None):
+    config = config or _config_shards()
+    return os.path.join(_pasta_geracao(config["geracao"]), f"progresso_{shard:02d}.csv")
+
+def id_registro(shard, offset):
+    return (shard << _ID_BITS) | offset
+
+def separar_id(rid):
+    return rid >> _ID_BITS, rid & ((1 << _ID_BITS) - 1)
+
+def _aguardar_resharding(limite=60.0):
+    # o resharding bloqueia as escritas por pouco tempo na troca de geração
+    fim = time.time() + limite
+    while os.path.exists(SHARDS_LOCK_FILE) and time.time() < fim:
+        time.sleep(0.05)
+
+def _criar_arquivos_shard(config):
+    os.makedirs(_pasta_geracao(config["geracao"]), exist_ok=True)
+    for shard in range(config["n"]):
+        for caminho, colunas in ((arquivo_usuarios_shard(shard, config), COLUNAS_USUARIOS),
+                                 (arquivo_progresso_shard(shard, config), COLUNAS_PROGRESSO)):
+            if not os.path.exists(caminho):
+                with open(caminho, "w", newline="", encoding="utf-8") as f:
+                    csv.writer(f).writerow(colunas)
+
+def _ler_registro_bruto(f):
+    # lê um registro csv completo a partir da posição atual de um arquivo binário
+    # (relatórios podem ter quebras de linha entre aspas, então junta linhas até fechar as aspas)
+    partes = []
+    while True:
+        linha = f.readline()
+        if not linha:
+            break
+        partes.append(linha)
+        if b"".join(partes).count(b'"') % 2 == 0:
+            break
+    if not partes:
+        return None
+    texto = b"".join(partes).decode("utf-8")
+    campos = next(csv.reader([texto]), [])
+    return campos
+
+def _iterar_arquivo_progresso(caminho, inicio=0, fim=None):
+    try:
+        f = open(caminho, "rb")
+    except FileNotFoundError:
+        return
+    with f:
+        f.seek(inicio)
+        while fim is None or f.tell() < fim:
+            offset = f.tell()
+            campos = _ler_registro_bruto(f)
+            if campos is None:
+                break
+            if offset == 0 or not campos or campos == COLUNAS_PROGRESSO:
+                continue  # cabeçalho / linha vazia
+            yield offset, dict(zip(COLUNAS_PROGRESSO, campos + [""] * (len(COLUNAS_PROGRESSO) - len(campos))))
+
+def iterar_progresso_shard(shard, inicio=0):
+    """Percorre o progresso de um shard devolvendo (offset, registro) a partir de um offset em bytes."""
+    return _iterar_arquivo_progresso(arquivo_progresso_shard(shard), inicio)
+
+def iterar_progresso():
+    """Percorre o progresso de todos os shards devolvendo (id do registro, registro)."""
+    for shard in range(_config_shards()["n"]):
+        for off, r in iterar_progresso_shard(shard):
+            yield id_registro(shard, off), r
+
+def iterar_progresso_usuario(email):
+    """(id do registro, registro) do usuário, lendo apenas o shard dele."""
+    shard = shard_de(email)
+    for off, r in iterar_progresso_shard(shard):
+        if r["email"] == email:
+            yield id_registro(shard, off), r
+
+def ler_progresso_por_id(ids):
+    por_shard = {}
+    for rid in ids:
+        por_shard.setdefault(separar_id(rid)[0], []).append(rid)
+    encontrados = {}
+    for shard, rids in por_shard.items():
+        with open(arquivo_progresso_shard(shard), "rb") as f:
+            for rid in rids:
+                f.seek(separar_id(rid)[1])
+                campos = _ler_registro_bruto(f)
+                if campos:
+                    encontrados[rid] = dict(zip(COLUNAS_PROGRESSO, campos + [""] * (len(COLUNAS_PROGRESSO) - len(campos))))
+    return [(rid, encontrados[rid]) for rid in ids if rid in encontrados]
+
+def _ler_linhas_usuarios(caminho):
+    # devolve as linhas já na ordem de COLUNAS_USUARIOS (header antigo: colunas ausentes viram "")
+    with open(caminho, "r", encoding="utf-8", newline="") as f:
+        reader = csv.reader(f)
+        cabecalho = next(reader, [])
+        posicoes = [cabecalho.index(c) if c in cabecalho else None for c in COLUNAS_USUARIOS]
+        return [[row[i] if i is not None and i < len(row) else "" for i in posicoes] for row in reader if row]
+
+def _distribuir_progresso(caminho, config, inicio=0, fim=None):
+    # copia registros de um arquivo de progresso para os shards de `config`, pelo hash do email
+    saidas = {}
+    try:
+        for _, r in _iterar_arquivo_progresso(caminho, inicio, fim):
+            shard = shard_de(r["email"], config["n"])
+            if shard not in saidas:
+                saidas[shard] = open(arquivo_progresso_shard(shard, config), "a", newline="", encoding="utf-8")
+            csv.writer(saidas[shard]).writerow([r[c] for c in COLUNAS_PROGRESSO])
+    finally:
+        for f in saidas.values():
+            f.close()
+
+def _distribuir_usuarios(linhas, config):
+    por_shard = {shard: [] for shard in range(config["n"])}
+    for linha in linhas:
+        por_shard[shard_de(linha[0], config["n"])].append(linha)
+    for shard, linhas_shard in por_shard.items():
+        with open(arquivo_usuarios_shard(shard, config), "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(COLUNAS_USUARIOS)
+            writer.writerows(linhas_shard)
+
+def _inicializar_shards():
+    """Cria a primeira geração de shards; se existirem users.csv/progresso.csv antigos, migra o conteúdo."""
+    if os.path.exists(SHARDS_CONFIG_FILE):
+        return
+    os.makedirs(SHARDS_DIR, exist_ok=True)
+    config = {"n": SHARDS_PADRAO, "geracao": 1}
+    shutil.rmtree(_pasta_geracao(1), ignore_errors=True)  # resto de uma migração interrompida
+    _criar_arquivos_shard(config)
+    if os.path.exists(USER_FILE):
+        _distribuir_usuarios(_ler_linhas_usuarios(USER_FILE), config)
+    if os.path.exists(PROGRESS_FILE):
+        _distribuir_progresso(PROGRESS_FILE, config)
+    _gravar_config_shards(config)
+    for antigo in (USER_FILE, PROGRESS_FILE):
+        if os.path.exists(antigo):
+            os.replace(antigo, antigo + ".migrado")
+    # índice e sinalizações guardam posições no arquivo antigo: serão refeitos
+    for derivado in (SEARCH_INDEX_FILE, FLAGS_FILE):
+        if os.path.exists(derivado):
+            os.remove(derivado)
+
+def reshardear(n_novo):
+    """
+    Redistribui os dados em n_novo shards sem parar o app: primeiro copia o progresso existente,
+    depois bloqueia as escritas por alguns instantes para copiar o que chegou, os usuários e
+    trocar a geração. O índice de busca e as sinalizações usam ids de registro e são refeitos.
+    """
+    antiga = dict(_config_shards())
+    nova = {"n": n_novo, "geracao": antiga["geracao"] + 1}
+    shutil.rmtree(_pasta_geracao(nova["geracao"]), ignore_errors=True)
+    _criar_arquivos_shard(nova)
+    copiado = {}
+    for shard in range(antiga["n"]):
+        caminho = arquivo_progresso_shard(shard, antiga)
+        copiado[shard] = os.path.getsize(caminho)
+        _distribuir_progresso(caminho, nova, 0, copiado[shard])
+    with open(SHARDS_LOCK_FILE, "w") as f:
+        f.write(str(os.getpid()))
+    try:
+        time.sleep(1.0)  # deixa terminar as escritas que começaram antes do bloqueio
+        for shard in range(antiga["n"]):
+            _distribuir_progresso(arquivo_progresso_shard(shard, antiga), nova, copiado[shard])
+        linhas = []
+        for shard in range(antiga["n"]):
+            linhas.extend(_ler_linhas_usuarios(arquivo_usuarios_shard(shard, antiga)))
+        _distribuir_usuarios(linhas, nova)
+        _gravar_config_shards(nova)
+    finally:
+        os.remove(SHARDS_LOCK_FILE)
+    for derivado in (SEARCH_INDEX_FILE, FLAGS_FILE):
+        if os.path.exists(derivado):
+            os.remove(derivado)
+    # a geração antiga fica em disco (algum app aberto pode estar lendo); pode ser apagada depois
+    return nova
+
+_inicializar_shards()
+
+class Nivel(str, Enum):
+    BASICO = "Básico"
+    INTERMEDIARIO = "Intermediário"
+    AVANCADO = "Avançado"
+
+    def __str__(self):
+        return self.value
+
+    __format__ = str.__format__  # f"{nivel}" mostra "Básico", não "Nivel.BASICO"
+
+    @property
+    def ordem(self):
+        return _ORDEM_NIVEIS[self]
+
+    @classmethod
+    def de_texto(cls, texto):
+        try:
+            return cls(texto)
+        except ValueError:
+            return cls.BASICO
+
+_ORDEM_NIVEIS = {Nivel.BASICO: 0, Nivel.INTERMEDIARIO: 1, Nivel.AVANCADO: 2}
+
+class Usuario:
+    """
+    Registro de um usuário de users.csv já convertido: pontos como int, nível como Nivel,
+    badges e recompensas como conjuntos (dict sem valores, para manter a ordem de conquista).
+    """
+    __slots__ = ("email", "senha", "nome", "pontos", "nivel", "ultimo_login", "badges", "rewards")
+    CAMPOS = tuple(COLUNAS_USUARIOS)
+
+    def __init__(self, email, senha="", nome="", pontos=0, nivel=Nivel.BASICO, ultimo_login="", badges=(), rewards=()):
+        self.email = email
+        self.senha = senha
+        self.nome = nome
+        self.pontos = pontos
+        self.nivel = nivel
+        self.ultimo_login = ultimo_login
+        self.badges = dict.fromkeys(badges)
+        self.rewards = dict.fromkeys(rewards)
+
+    @classmethod
+    def de_linha(cls, campos):
+        # campos na ordem de CAMPOS; colunas ausentes (arquivos antigos) chegam como ""
+        email, senha, nome, pontos, nivel, ultimo_login, badges, rewards = campos
+        try:
+            pontos = int(pontos)
+        except ValueError:
+            pontos = 0
+        return cls(email, senha, nome, pontos, Nivel.de_texto(nivel), ultimo_login,
+                   (b.strip() for b in badges.split(",") if b.strip()),
+                   (r for r in rewards.split(";") if r))
+
+    def para_linha(self):
+        return [self.email, self.senha, self.nome, str(self.pontos), self.nivel.value,
+                self.ultimo_login, ", ".join(self.badges), ";".join(self.rewards)]
+
+    def copia(self):
+        return Usuario(self.email, self.senha, self.nome, self.pontos, self.nivel,
+                       self.ultimo_login, self.badges, self.rewards)
+
+    def __repr__(self):
+        return f"Usuario({self.email!r}, pontos={self.pontos}, nivel={self.nivel.value!r})"
+
+def carregar_usuarios(email=None):
+    """Todos os usuários, ou só os do shard de `email` (suficiente para alterar esse usuário)."""
+    shards = [shard_de(email)] if email is not None else range(_config_shards()["n"])
     users = {}
-    # lidar com header antigo ou novo: DictReader retornará apenas colunas presentes.
-    with open(USER_FILE, "r", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            # garantir que chaves essenciais existam e preencher defaults
-            if "rewards" not in row:
-                row["rewards"] = ""  # lista de ids de recompensas resgatadas separadas por ';'
-            if "badges" not in row:
-                row["badges"] = ""
-            users[row["email"]] = row
+    for shard in shards:
+        for campos in _ler_linhas_usuarios(arquivo_usuarios_shard(shard)):
+            u = Usuario.de_linha(campos)
+            users[u.email] = u
+    # logins ainda não gravados em disco valem como se já estivessem no arquivo
+    for e, data in registro_logins.pendentes().items():
+        if e in users:
+            users[e].ultimo_login = data
     return users
 
 def salvar_usuarios_dict(users: dict):
-    with open(USER_FILE, "w", newline="", encoding="utf-8") as f:
-        # agora gravamos com a coluna 'rewards' também
-        fieldnames = ["email", "senha", "nome", "pontos", "nivel", "ultimo_login", "badges", "rewards"]
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-        for u in users.values():
-            # garantir chaves existam antes de escrever
-            row = {
-                "email": u.get("email",""),
-                "senha": u.get("senha",""),
-                "nome": u.get("nome",""),
-                "pontos": u.get("pontos","0"),
-                "nivel": u.get("nivel","Básico"),
-                "ultimo_login": u.get("ultimo_login", ""),
-                "badges": u.get("badges", ""),
-                "rewards": u.get("rewards", "")
-            }
-            writer.writerow(row)
-
-def definir_nivel(pontos: int) -> str:
+    """Regrava os shards dos usuários em `users`, que deve trazer todos os usuários desses shards."""
+    for email, data in registro_logins.pendentes().items():
+        if email in users:
+            users[email].ultimo_login = data
+    _aguardar_resharding()
+    por_shard = {}
+    for u in users.values():
+        por_shard.setdefault(shard_de(u.email), []).append(u)
+    with _USERS_LOCK:
+        for shard, lista in por_shard.items():
+            with open(arquivo_usuarios_shard(shard), "w", newline="", encoding="utf-8") as f:
+                writer = csv.writer(f)
+                writer.writerow(Usuario.CAMPOS)
+                writer.writerows(u.para_linha() for u in lista)
+        placar_grupos.atualizar(users)
+
+def definir_nivel(pontos: int) -> Nivel:
     if pontos < 80:
-        return "Básico"
+        return Nivel.BASICO
     elif pontos < 180:
-        return "Intermediário"
+        return Nivel.INTERMEDIARIO
     else:
-        return "Avançado"
+        return Nivel.AVANCADO
 
 def pontos_para_proximo_nivel(pontos: int):
     # simples referência de transição; pode ajustar conforme relatório.
@@ -113,10 +459,317 @@ def pontos_para_proximo_nivel(pontos: int):
     else:
         return 0
 
-def salvar_progresso(email, tarefa, pontos, relatorio):
-    with open(PROGRESS_FILE, "a", newline="", encoding="utf-8") as f:
+# -------- Grupos (equipes) ----------
+_grupos_lock = threading.Lock()
+
+def carregar_membros_grupos():
+    """{grupo: {"tipo": tipo, "membros": [emails]}}"""
+    grupos = {}
+    try:
+        with open(GROUPS_FILE, "r", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                grupos.setdefault(row["grupo"], {"tipo": row["tipo"], "membros": []})["membros"].append(row["email"])
+    except FileNotFoundError:
+        pass
+    return grupos
+
+def entrar_no_grupo(email, grupo, tipo="turma", registrar=True):
+    """Adiciona o usuário ao grupo. Retorna False se ele já era membro."""
+    with _grupos_lock:
+        grupos = carregar_membros_grupos()
+        if grupo in grupos:
+            if email in grupos[grupo]["membros"]:
+                return False
+            tipo = grupos[grupo]["tipo"]  # o tipo é definido por quem criou o grupo
+        novo = not os.path.exists(GROUPS_FILE)
+        with open(GROUPS_FILE, "a", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            if novo:
+                writer.writerow(["grupo", "tipo", "email"])
+            writer.writerow([grupo, tipo, email])
+    u = carregar_usuarios(email).get(email)
+    if u is not None:
+        placar_grupos.entrar(grupo, tipo, u)
+    if registrar:
+        registrar_alteracao("grupo", {"email": email, "grupo": grupo, "tipo": tipo})
+    return True
+
+class PlacarGrupos:
+    """
+    Agregados por grupo (total de pontos, média e membros ativos) mantidos em memória. É montado
+    uma vez a partir de data/ e depois só recebe as diferenças de quem teve pontos ou login
+    alterados em salvar_usuarios_dict. Grupos e membros ficam em listas ordenadas (bisect),
+    então o top-K e o ranking interno de um grupo não percorrem os usuários.
+    """
+    def __init__(self, dias_ativo=30):
+        self.dias_ativo = dias_ativo  # membro ativo = login nos últimos `dias_ativo` dias
+        self._lock = threading.RLock()
+        self._pronto = False
+
+    def _construir(self):
+        self._tipo = {}       # grupo -> tipo
+        self._grupos_de = {}  # email -> [grupos]
+        self._membro = {}     # email -> (pontos, ultimo_login, nome)
+        self._pontos = {}     # grupo -> [(-pontos, email)] ordenada
+        self._logins = {}     # grupo -> [ultimo_login] ordenada
+        self._total = {}      # grupo -> soma dos pontos
+        self._por_total = []  # [(-total, grupo)] ordenada
+        self._por_media = []  # [(-média, grupo)] ordenada
+        users = carregar_usuarios()
+        for grupo, info in carregar_membros_grupos().items():
+            self._novo_grupo(grupo, info["tipo"])
+            self._tirar_grupo(grupo)
+            for email in info["membros"]:
+                u = users.get(email)
+                if u is not None:
+                    self._membro[email] = (u.pontos, u.ultimo_login, u.nome)
+                    self._grupos_de.setdefault(email, []).append(grupo)
+                    self._adicionar_membro(grupo, email)
+            self._por_grupo(grupo)
+        self._pronto = True
+
+    def _garantir(self):
+        if not self._pronto:
+            self._construir()
+
+    def _media(self, grupo):
+        n = len(self._pontos[grupo])
+        return self._total[grupo] / n if n else 0
+
+    def _novo_grupo(self, grupo, tipo):
+        self._tipo[grupo] = tipo
+        self._pontos[grupo] = []
+        self._logins[grupo] = []
+        self._total[grupo] = 0
+        self._por_grupo(grupo)
+
+    def _por_grupo(self, grupo):
+        bisect.insort(self._por_total, (-self._total[grupo], grupo))
+        bisect.insort(self._por_media, (-self._media(grupo), grupo))
+
+    def _tirar_grupo(self, grupo):
+        for lista, chave in ((self._por_total, -self._total[grupo]), (self._por_media, -self._media(grupo))):
+            del lista[bisect.bisect_left(lista, (chave, grupo))]
+
+    def _adicionar_membro(self, grupo, email):
+        pontos, login, _ = self._membro[email]
+        bisect.insort(self._pontos[grupo], (-pontos, email))
+        bisect.insort(self._logins[grupo], login)
+        self._total[grupo] += pontos
+
+    def _remover_membro(self, grupo, email):
+        pontos, login, _ = self._membro[email]
+        del self._pontos[grupo][bisect.bisect_left(self._pontos[grupo], (-pontos, email))]
+        del self._logins[grupo][bisect.bisect_left(self._logins[grupo], login)]
+        self._total[grupo] -= pontos
+
+    def atualizar(self, users):
+        """Aplica aos grupos as mudanças de pontos/login dos usuários recém-gravados."""
+        with self._lock:
+            if not self._pronto:
+                return  # ainda não consultado: será montado direto do disco
+            for u in users.values():
+                grupos = self._grupos_de.get(u.email)
+                if not grupos or self._membro[u.email] == (u.pontos, u.ultimo_login, u.nome):
+                    continue
+                for grupo in grupos:
+                    self._tirar_grupo(grupo)
+                    self._remover_membro(grupo, u.email)
+                self._membro[u.email] = (u.pontos, u.ultimo_login, u.nome)
+                for grupo in grupos:
+                    self._adicionar_membro(grupo, u.email)
+                    self._por_grupo(grupo)
+
+    def entrar(self, grupo, tipo, u):
+        with self._lock:
+            if not self._pronto:
+                return
+            if grupo not in self._tipo:
+                self._novo_grupo(grupo, tipo)
+            self._tirar_grupo(grupo)
+            self._membro.setdefault(u.email, (u.pontos, u.ultimo_login, u.nome))
+            self._grupos_de.setdefault(u.email, []).append(grupo)
+            self._adicionar_membro(grupo, u.email)
+            self._por_grupo(grupo)
+
+    def _resumo(self, grupo):
+        n = len(self._pontos[grupo])
+        limite = str(datetime.date.today() - datetime.timedelta(days=self.dias_ativo))
+        return {"grupo": grupo, "tipo": self._tipo[grupo], "total": self._total[grupo],
+                "media": round(self._media(grupo), 1), "membros": n,
+                "ativos": n - bisect.bisect_left(self._logins[grupo], limite)}
+
+    def top_grupos(self, k=10, por="total", tipo=None):
+        """Os k primeiros grupos por "total" ou "media", opcionalmente só de um tipo."""
+        with self._lock:
+            self._garantir()
+            resultado = []
+            for _, grupo in (self._por_total if por == "total" else self._por_media):
+                if tipo is None or self._tipo[grupo] == tipo:
+                    resultado.append(self._resumo(grupo))
+                    if len(resultado) == k:
+                        break
+            return resultado
+
+    def ranking_do_grupo(self, grupo, k=None):
+        """[(nome, email, pontos)] dos membros do grupo, do maior para o menor."""
+        with self._lock:
+            self._garantir()
+            return [(self._membro[email][2], email, -neg) for neg, email in self._pontos.get(grupo, [])[:k]]
+
+    def grupos_do_usuario(self, email):
+        with self._lock:
+            self._garantir()
+            return [self._resumo(g) for g in self._grupos_de.get(email, [])]
+
+placar_grupos = PlacarGrupos()
+
+# -------- Sessão / registro de logins ----------
+class RegistroLogins:
+    """
+    Guarda o ultimo_login dos usuários em memória e grava users.csv em lote, numa thread,
+    alguns segundos depois do primeiro login pendente. Cada login também vai para um
+    diário pequeno (logins_pendentes.log) para não ser perdido se o app fechar antes.
+    """
+    def __init__(self, atraso=5.0):
+        self.atraso = atraso
+        self._pendentes = {}
+        self._lock = threading.Lock()
+        self._timer = None
+
+    def pendentes(self):
+        with self._lock:
+            return dict(self._pendentes)
+
+    def recuperar_diario(self):
+        try:
+            with open(LOGIN_JOURNAL_FILE, "r", encoding="utf-8") as f:
+                for linha in f:
+                    email, _, data = linha.strip().rpartition(",")
+                    if email:
+                        self._pendentes[email] = data
+        except FileNotFoundError:
+            return
+        if self._pendentes:
+            self.descarregar()
+
+    def registrar(self, email, data):
+        with self._lock:
+            self._pendentes[email] = data
+            with open(LOGIN_JOURNAL_FILE, "a", encoding="utf-8") as f:
+                f.write(f"{email},{data}\n")
+                f.flush()
+                os.fsync(f.fileno())
+            if self._timer is None:
+                self._timer = threading.Timer(self.atraso, self.descarregar)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def descarregar(self):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            lote = dict(self._pendentes)
+        if not lote:
+            return
+        with _USERS_LOCK:
+            users = {}
+            for email in lote:
+                if email not in users:
+                    users.update(carregar_usuarios(email))  # shard do email
+            salvar_usuarios_dict(users)  # ambos aplicam os pendentes
+            with self._lock:
+                for email, data in lote.items():
+                    if self._pendentes.get(email) == data:
+                        del self._pendentes[email]
+                # reescreve o diário só com o que chegou durante a gravação
+                with open(LOGIN_JOURNAL_FILE, "w", encoding="utf-8") as f:
+                    f.writelines(f"{email},{data}\n" for email, data in self._pendentes.items())
+
+registro_logins = RegistroLogins()
+registro_logins.recuperar_diario()
+atexit.register(registro_logins.descarregar)
+
+class Sessao:
+    """Sessão do usuário logado. Guarda uma cópia do registro; alterações passam por users.csv."""
+    def __init__(self, usuario):
+        self.email = usuario.email
+        self.inicio = datetime.datetime.now()
+        self._dados = usuario.copia()
+
+    @property
+    def usuario(self):
+        return self._dados
+
+    def atualizar(self, usuario):
+        self._dados = usuario.copia()
+
+def creditar_pontos(usuario: Usuario, pontos: int):
+    """Soma pontos e atualiza nível/badge. Retorna o novo nível se ele mudou, senão None."""
+    usuario.pontos += pontos
+    novo_nivel = definir_nivel(usuario.pontos)
+    if novo_nivel != usuario.nivel:
+        usuario.nivel = novo_nivel
+        adicionar_badge(usuario, novo_nivel)
+        return novo_nivel
+    return None
+
+# uma trava por shard: a UI e a thread de sincronização podem gravar no mesmo shard ao mesmo tempo
+_progresso_locks = {}
+_progresso_locks_lock = threading.Lock()
+
+def _trava_progresso(shard):
+    with _progresso_locks_lock:
+        return _progresso_locks.setdefault(shard, threading.Lock())
+
+def salvar_progresso(email, tarefa, pontos, relatorio, data=None):
+    _aguardar_resharding()
+    shard = shard_de(email)
+    # o offset só identifica a linha se ninguém gravar no shard entre o tell() e o fim da escrita
+    with _trava_progresso(shard), open(arquivo_progresso_shard(shard), "a", newline="", encoding="utf-8") as f:
+        offset = f.tell()  # posição em bytes da linha nova = identificador do registro no shard
         writer = csv.writer(f)
-        writer.writerow([email, str(datetime.date.today()), tarefa, pontos, relatorio])
+        writer.writerow([email, data or str(datetime.date.today()), tarefa, pontos, relatorio])
+    indexar_relatorio(id_registro(shard, offset), relatorio)
+
+# Atividade por usuário em memória, para consultas por intervalo de datas (calendário).
+# Só o trecho novo do shard do usuário é lido a cada consulta.
+_atividade = {"geracao": None, "lido_ate": {}, "por_usuario": {}}  # email -> {"datas": [ordenadas], "dias": {data: [(id, registro)]}}
+
+def _atualizar_atividade(shard):
+    config = _config_shards()
+    if _atividade["geracao"] != config["geracao"]:
+        _atividade.update({"geracao": config["geracao"], "lido_ate": {}, "por_usuario": {}})
+    try:
+        tamanho = os.path.getsize(arquivo_progresso_shard(shard, config))
+    except OSError:
+        return
+    lido_ate = _atividade["lido_ate"].get(shard, 0)
+    if tamanho == lido_ate:
+        return
+    for off, r in _iterar_arquivo_progresso(arquivo_progresso_shard(shard, config), lido_ate, tamanho):
+        u = _atividade["por_usuario"].setdefault(r["email"], {"datas": [], "dias": {}})
+        if r["data"] not in u["dias"]:
+            u["dias"][r["data"]] = []
+            bisect.insort(u["datas"], r["data"])
+        u["dias"][r["data"]].append((id_registro(shard, off), r))
+    _atividade["lido_ate"][shard] = tamanho
+
+def atividade_no_periodo(email, inicio, fim):
+    """{data: [registro]} do usuário entre inicio e fim (datetime.date, inclusive), sem os sinalizados."""
+    _atualizar_atividade(shard_de(email))
+    u = _atividade["por_usuario"].get(email)
+    if not u:
+        return {}
+    sinalizados = carregar_sinalizados()
+    datas = u["datas"]
+    resultado = {}
+    for i in range(bisect.bisect_left(datas, str(inicio)), bisect.bisect_right(datas, str(fim))):
+        registros = [r for rid, r in u["dias"][datas[i]] if rid not in sinalizados]
+        if registros:
+            resultado[datas[i]] = registros
+    return resultado
 
 def obter_tarefas_por_nivel(nivel):
     tasks = []
@@ -130,37 +783,242 @@ def obter_tarefas_por_nivel(nivel):
 def contar_tarefas_dia(email, date=None):
     if date is None:
         date = str(datetime.date.today())
-    count = 0
+    return sum(1 for _, r in iterar_progresso_usuario(email) if r["data"] == date)
+
+def adicionar_badge(usuario: Usuario, nivel: Nivel):
+    for regra in carregar_regras_conquistas()[0]:
+        if regra["tipo"] == "nivel" and Nivel.de_texto(regra["parametro"]) == nivel:
+            usuario.badges[regra["titulo"]] = None
+
+# -------- Conquistas ----------
+# Cada regra de conquistas.csv guarda um estado pequeno por usuário (contador, trechos de dias seguidos),
+# atualizado em O(1) a cada tarefa concluída. O estado de cada shard fica em memória e em conquistas_NN.jsonl:
+# a primeira linha identifica as regras, as seguintes trazem só os usuários alterados em cada atualização
+# (junto do offset do progresso já processado). Quando o arquivo cresce demais ele é compactado.
+_FORMATO_CONQUISTAS = "2"  # muda quando o formato do estado muda, forçando refazer os estados
+SEQUENCIA_JANELA_DIAS = 60  # tarefas com até essa defasagem (ex.: sincronizadas depois) ainda emendam sequências
+_conquistas_lock = threading.RLock()
+_regras_cache = {"mtime": None, "regras": [], "versao": ""}
+_categorias_cache = {"mtime": None, "categorias": {}, "versao": ""}
+_conquistas_cache = {"geracao": None, "shards": {}}  # shard -> {"versao", "lido_ate", "usuarios", "tamanho", "linhas"}
+
+def carregar_regras_conquistas():
+    """(regras, versao) — versao muda quando conquistas.csv é editado e força refazer os estados."""
+    mtime = os.path.getmtime(ACHIEVEMENTS_FILE)
+    if _regras_cache["mtime"] != mtime:
+        with open(ACHIEVEMENTS_FILE, "r", encoding="utf-8") as f:
+            conteudo = f.read()
+        regras = []
+        for row in csv.DictReader(conteudo.splitlines()):
+            row["alvo"] = int(row["alvo"]) if row["alvo"].strip() else 0
+            regras.append(row)
+        _regras_cache.update({"mtime": mtime, "regras": regras, "versao": md5(conteudo)})
+    return _regras_cache["regras"], _regras_cache["versao"]
+
+def _carregar_categorias():
+    mtime = os.path.getmtime(TASKS_FILE)
+    if _categorias_cache["mtime"] != mtime:
+        with open(TASKS_FILE, "r", encoding="utf-8") as f:
+            categorias = {row["tarefa"]: row.get("categoria") or CATEGORIAS_TAREFAS.get(row["tarefa"], "Geral")
+                          for row in csv.DictReader(f)}
+        _categorias_cache.update({"mtime": mtime, "categorias": categorias,
+                                  "versao": md5(json.dumps(categorias, sort_keys=True))})
+    return _categorias_cache
+
+def categoria_da_tarefa(tarefa):
+    return _carregar_categorias()["categorias"].get(tarefa) or CATEGORIAS_TAREFAS.get(tarefa, "Geral")
+
+def _versao_conquistas():
+    # as regras de categoria dependem de tarefas.csv: mudar a categoria de uma tarefa também refaz os estados
+    return md5(f"{_FORMATO_CONQUISTAS}|{carregar_regras_conquistas()[1]}|{_carregar_categorias()['versao']}")
+
+def _avancar_regra(regra, estado, registro):
+    """Aplica uma tarefa concluída ao estado da regra. Retorna o estado novo e se a meta foi atingida."""
+    if regra["tipo"] == "sequencia":
+        # trechos de dias seguidos {início: fim}; uma data atrasada pode emendar dois trechos
+        data = registro["data"]
+        trechos = estado.get("trechos", {})
+        if any(i <= data <= f for i, f in trechos.items()):
+            return estado, False
+        dia = datetime.date.fromisoformat(data)
+        ontem, amanha = str(dia - datetime.timedelta(days=1)), str(dia + datetime.timedelta(days=1))
+        inicio = next((i for i, f in trechos.items() if f == ontem), data)
+        trechos = dict(trechos)
+        fim = trechos.pop(amanha, data)
+        trechos[inicio] = fim
+        # trechos muito antigos não recebem mais datas: descartá-los mantém o estado pequeno
+        limite = str(datetime.date.fromisoformat(max(trechos.values())) - datetime.timedelta(days=SEQUENCIA_JANELA_DIAS))
+        trechos = {i: f for i, f in trechos.items() if f >= limite}
+        dias = (datetime.date.fromisoformat(fim) - datetime.date.fromisoformat(inicio)).days + 1
+        return {"trechos": trechos}, dias >= regra["alvo"]
+    if regra["tipo"] == "contagem" or (regra["tipo"] == "categoria" and
+                                      categoria_da_tarefa(registro["tarefa"]) == regra["parametro"]):
+        estado = {"n": estado.get("n", 0) + 1}
+    return estado, estado.get("n", 0) >= regra["alvo"]
+
+def _processar_conquistas(usuarios, registros, regras):
+    """
+    Passa os registros de progresso pelas regras, alterando `usuarios` (email -> {"estado", "desbloqueadas"}).
+    Retorna {email: [regras desbloqueadas agora]}.
+    """
+    novas = {}
+    regras = [r for r in regras if r["tipo"] != "nivel"]  # as de nível dependem dos pontos, não das tarefas
+    for r in registros:
+        u = usuarios.setdefault(r["email"], {"estado": {}, "desbloqueadas": []})
+        for regra in regras:
+            if regra["id"] in u["desbloqueadas"]:
+                continue
+            estado, atingida = _avancar_regra(regra, u["estado"].get(regra["id"], {}), r)
+            if atingida:
+                u["desbloqueadas"].append(regra["id"])
+                u["estado"].pop(regra["id"], None)  # regra concluída não precisa mais de estado
+                novas.setdefault(r["email"], []).append(regra)
+            else:
+                u["estado"][regra["id"]] = estado
+    return novas
+
+def _arquivo_conquistas_shard(shard, config=None):
+    config = config or _config_shards()
+    return os.path.join(_pasta_geracao(config["geracao"]), f"conquistas_{shard:02d}.jsonl")
+
+def _compactar_conquistas(caminho, dados):
+    tmp = caminho + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(json.dumps({"versao": dados["versao"]}) + "\n")
+        f.write(json.dumps({"lido_ate": dados["lido_ate"], "usuarios": dados["usuarios"]}, ensure_ascii=False) + "\n")
+    os.replace(tmp, caminho)
+    dados["tamanho"] = os.path.getsize(caminho)
+    dados["linhas"] = 1
+
+def _estado_conquistas(shard, config, versao):
+    caminho = _arquivo_conquistas_shard(shard, config)
+    if _conquistas_cache["geracao"] != config["geracao"]:
+        _conquistas_cache.update({"geracao": config["geracao"], "shards": {}})
+    dados = _conquistas_cache["shards"].get(shard)
     try:
-        with open(PROGRESS_FILE, "r", encoding="utf-8") as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                if row["email"] == email and row["data"] == date:
-                    count += 1
-    except FileNotFoundError:
-        return 0
-    return count
+        tamanho = os.path.getsize(caminho)
+    except OSError:
+        tamanho = None
+    # o arquivo só muda por aqui; tamanho diferente = outro processo o refez (ex.: --reconstruir-conquistas)
+    if dados is not None and dados["versao"] == versao and dados["tamanho"] == tamanho:
+        return dados
+    dados = {"versao": versao, "lido_ate": 0, "usuarios": {}, "tamanho": None, "linhas": 0}
+    integro = False
+    if tamanho is not None:
+        with open(caminho, "r", encoding="utf-8") as f:
+            for n, linha in enumerate(f):
+                try:
+                    registro = json.loads(linha)
+                except ValueError:
+                    integro = False  # última linha cortada (app fechado no meio da gravação)
+                    break
+                if n == 0:
+                    if registro.get("versao") != versao:
+                        break  # regras mudaram: refaz o shard desde o início
+                    integro = True
+                    continue
+                dados["lido_ate"] = registro["lido_ate"]
+                dados["usuarios"].update(registro["usuarios"])
+                dados["linhas"] += 1
+    if integro:
+        dados["tamanho"] = tamanho
+    else:
+        _compactar_conquistas(caminho, dados)
+    _conquistas_cache["shards"][shard] = dados
+    return dados
+
+def atualizar_conquistas(shard):
+    """Processa o progresso do shard ainda não visto pelas regras. Retorna {email: [regras desbloqueadas agora]}."""
+    regras = carregar_regras_conquistas()[0]
+    versao = _versao_conquistas()
+    config = _config_shards()
+    with _conquistas_lock:
+        dados = _estado_conquistas(shard, config, versao)
+        progresso = arquivo_progresso_shard(shard, config)
+        try:
+            tamanho = os.path.getsize(progresso)
+        except OSError:
+            return {}
+        if tamanho == dados["lido_ate"]:
+            return {}
+        registros = [r for _, r in _iterar_arquivo_progresso(progresso, dados["lido_ate"], tamanho)]
+        novas = _processar_conquistas(dados["usuarios"], registros, regras)
+        dados["lido_ate"] = tamanho
+        caminho = _arquivo_conquistas_shard(shard, config)
+        if dados["linhas"] >= max(100, len(dados["usuarios"])):
+            _compactar_conquistas(caminho, dados)
+        else:
+            # só os usuários das tarefas novas, numa linha só (uma gravação = uma atualização inteira)
+            alterados = {r["email"]: dados["usuarios"][r["email"]] for r in registros}
+            linha = (json.dumps({"lido_ate": tamanho, "usuarios": alterados}, ensure_ascii=False) + "\n").encode("utf-8")
+            with open(caminho, "ab") as f:
+                f.write(linha)
+            dados["tamanho"] += len(linha)
+            dados["linhas"] += 1
+    return novas
+
+def registrar_conquistas(email):
+    """Atualiza as conquistas do shard do usuário e grava as badges novas. Retorna os títulos novos dele."""
+    novas = atualizar_conquistas(shard_de(email))
+    ganhas = {}
+    if novas:
+        with _USERS_LOCK:
+            users = carregar_usuarios(email)
+            for e, regras in novas.items():
+                u = users.get(e)
+                if u is None:
+                    continue
+                # estados refeitos (regras editadas, resharding) desbloqueiam de novo o que o usuário já tem
+                titulos = [regra["titulo"] for regra in regras if regra["titulo"] not in u.badges]
+                for titulo in titulos:
+                    u.badges[titulo] = None
+                if titulos:
+                    ganhas[e] = titulos
+            if ganhas:
+                salvar_usuarios_dict(users)
+    return ganhas.get(email, [])
 
-def adicionar_badge(usuario: dict, nivel: str):
-    badges_map = {
-        "Básico": "🌱 Consciente",
-        "Intermediário": "♻️ Engajado",
-        "Avançado": "🌍 Sustentável"
-    }
-    badge = badges_map.get(nivel, "")
-    if not usuario.get("badges"):
-        usuario["badges"] = badge
-    elif badge not in usuario["badges"]:
-        usuario["badges"] += f", {badge}"
+def _reconstruir_conquistas_shard(shard):
+    try:
+        os.remove(_arquivo_conquistas_shard(shard))
+    except FileNotFoundError:
+        pass
+    atualizar_conquistas(shard)
+    dados = _estado_conquistas(shard, _config_shards(), _versao_conquistas())
+    return {email: u["desbloqueadas"] for email, u in dados["usuarios"].items()}
+
+def reconstruir_conquistas(processos=None):
+    """Refaz o estado das regras a partir de todo o histórico (um processo por shard) e acerta as badges."""
+    n = _config_shards()["n"]
+    with multiprocessing.Pool(processos) as pool:
+        desbloqueadas = pool.map(_reconstruir_conquistas_shard, range(n))
+    _conquistas_cache["shards"].clear()  # os estados foram refeitos nos outros processos
+    titulos = {r["id"]: r["titulo"] for r in carregar_regras_conquistas()[0]}
+    with _USERS_LOCK:
+        users = carregar_usuarios()
+        for por_usuario in desbloqueadas:
+            for email, ids in por_usuario.items():
+                if email in users:
+                    for rid in ids:
+                        users[email].badges[titulos[rid]] = None
+        salvar_usuarios_dict(users)
+    return sum(len(ids) for por_usuario in desbloqueadas for ids in por_usuario.values())
 
 # -------- Recompensas (novas funções) ----------
+def _normalizar_recompensa(row):
+    row["custo_pontos"] = int(row["custo_pontos"])
+    # arquivos antigos não têm as colunas de estoque: vale como sem limite
+    row["estoque"] = int(row["estoque"]) if (row.get("estoque") or "").strip() else None
+    row["limite_periodo"] = int(row["limite_periodo"]) if (row.get("limite_periodo") or "").strip() else None
+    row["periodo"] = (row.get("periodo") or "").strip() or None
+    return row
+
 def carregar_recompensas():
     rewards = []
     with open(REWARDS_FILE, "r", encoding="utf-8") as f:
         reader = csv.DictReader(f)
         for row in reader:
-            row["custo_pontos"] = int(row["custo_pontos"])
-            rewards.append(row)
+            rewards.append(_normalizar_recompensa(row))
     return rewards
 
 def obter_recompensa_por_id(rid):
@@ -168,46 +1026,1208 @@ def obter_recompensa_por_id(rid):
         reader = csv.DictReader(f)
         for row in reader:
             if row["id"] == rid:
-                row["custo_pontos"] = int(row["custo_pontos"])
-                return row
+                return _normalizar_recompensa(row)
     return None
 
 def usuario_tem_resgatado(usuario, reward_id):
-    rewards = usuario.get("rewards", "")
-    if not rewards:
+    return reward_id in usuario.rewards
+
+def _chave_periodo(periodo, data):
+    if periodo == "dia":
+        return data.isoformat()
+    if periodo == "semana":
+        ano, semana, _ = data.isocalendar()
+        return f"{ano}-W{semana:02d}"
+    if periodo == "mes":
+        return data.strftime("%Y-%m")
+    return ""
+
+class MotorResgates:
+    """
+    Processa os resgates numa única thread escritora. Os pedidos entram numa fila; a thread
+    junta o que estiver esperando (até `lote` pedidos), valida tudo em memória (nível, pontos,
+    duplicidade, estoque e limite por período) e grava de uma vez: um arquivo por shard de
+    usuários tocado e uma linha por resgate feito em resgates.csv. Como só essa thread altera o
+    estoque, dois resgates simultâneos nunca passam do limite. Resgates vindos da sincronização
+    e estornos passam pela mesma fila, para o estoque contar os de todas as máquinas.
+    As contagens do lote só passam a valer depois que a gravação dá certo.
+    """
+    def __init__(self, lote=500):
+        self.lote = lote
+        self._fila = queue.Queue()
+        self._thread = None
+        self._iniciar_lock = threading.Lock()
+        self._emitidos = {}     # reward_id -> quantidade resgatada
+        self._por_periodo = {}  # (reward_id, chave do período) -> quantidade
+        self._resultados = {}   # chave do pedido -> (True, mensagem), só dos resgates gravados
+        self._ativos = {}       # (email, reward_id) -> (chave, período) do resgate em vigor
+
+    @staticmethod
+    def _novo_lote():
+        # alterações pendentes do lote; None em "resultados"/"ativos" = removido no lote
+        return {"emitidos": {}, "por_periodo": {}, "resultados": {}, "ativos": {}}
+
+    def _efetivar(self, lote):
+        for reward_id, delta in lote["emitidos"].items():
+            self._emitidos[reward_id] = self._emitidos.get(reward_id, 0) + delta
+        for k, delta in lote["por_periodo"].items():
+            self._por_periodo[k] = self._por_periodo.get(k, 0) + delta
+        for destino, origem in ((self._resultados, lote["resultados"]), (self._ativos, lote["ativos"])):
+            for k, v in origem.items():
+                if v is None:
+                    destino.pop(k, None)
+                else:
+                    destino[k] = v
+
+    def _carregar_registro(self):
+        lote = self._novo_lote()
+        try:
+            with open(REDEMPTIONS_FILE, "r", encoding="utf-8") as f:
+                for r in csv.DictReader(f):
+                    if r["status"] == "ok":
+                        self._marcar(lote, r["chave"], r["email"], r["reward_id"], r["periodo"], r["mensagem"])
+                    elif r["status"] == "estorno":
+                        self._desmarcar(lote, r["email"], r["reward_id"])
+        except FileNotFoundError:
+            pass
+        self._efetivar(lote)
+
+    def _contar(self, lote, reward_id, chave_periodo, delta=1):
+        lote["emitidos"][reward_id] = lote["emitidos"].get(reward_id, 0) + delta
+        if chave_periodo:
+            k = (reward_id, chave_periodo)
+            lote["por_periodo"][k] = lote["por_periodo"].get(k, 0) + delta
+
+    def _emitidos_com(self, lote, reward_id):
+        return self._emitidos.get(reward_id, 0) + lote["emitidos"].get(reward_id, 0)
+
+    def _no_periodo_com(self, lote, reward_id, periodo):
+        k = (reward_id, periodo)
+        return self._por_periodo.get(k, 0) + lote["por_periodo"].get(k, 0)
+
+    def _resultado_com(self, lote, chave):
+        return lote["resultados"][chave] if chave in lote["resultados"] else self._resultados.get(chave)
+
+    def _marcar(self, lote, chave, email, reward_id, periodo, mensagem):
+        lote["resultados"][chave] = (True, mensagem)
+        lote["ativos"][(email, reward_id)] = (chave, periodo)
+        self._contar(lote, reward_id, periodo)
+
+    def _desmarcar(self, lote, email, reward_id):
+        """Desfaz a contagem do resgate em vigor. Retorna (chave, período) dele, ou None."""
+        k = (email, reward_id)
+        ativo = lote["ativos"][k] if k in lote["ativos"] else self._ativos.get(k)
+        if ativo is not None:
+            lote["ativos"][k] = None
+            lote["resultados"][ativo[0]] = None
+            self._contar(lote, reward_id, ativo[1], -1)  # devolve no período em que foi resgatado
+        return ativo
+
+    def _garantir_thread(self):
+        with self._iniciar_lock:
+            if self._thread is None:
+                self._carregar_registro()
+                self._thread = threading.Thread(target=self._loop, daemon=True)
+                self._thread.start()
+
+    def _enfileirar(self, op, dados):
+        self._garantir_thread()
+        futuro = Future()
+        self._fila.put((op, dados, futuro))
+        return futuro
+
+    def enviar(self, usuario_email, reward_id, chave=None):
+        """
+        Enfileira um resgate e devolve um Future com (ok, mensagem). `chave` identifica a tentativa:
+        reenviar com a mesma chave um resgate já gravado devolve a mesma resposta sem descontar de novo.
+        """
+        return self._enfileirar("resgate", (usuario_email, reward_id, chave or uuid.uuid4().hex))
+
+    def aplicar_remoto(self, dados, chave):
+        """Aplica um resgate feito em outra máquina (usuário, estoque e resgates.csv)."""
+        return self._enfileirar("remoto", (dados, chave))
+
+    def estornar(self, dados):
+        """Desfaz um resgate (ex.: recusado pelo servidor de sincronização) e libera a unidade."""
+        return self._enfileirar("estorno", (dados, None))
+
+    def restante(self, recompensa):
+        """Unidades ainda disponíveis da recompensa (None = sem limite de estoque)."""
+        self._garantir_thread()
+        if recompensa["estoque"] is None:
+            return None
+        return max(0, recompensa["estoque"] - self._emitidos.get(recompensa["id"], 0))
+
+    def _loop(self):
+        while True:
+            pedidos = [self._fila.get()]
+            while len(pedidos) < self.lote:
+                try:
+                    pedidos.append(self._fila.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._processar(pedidos)
+            except Exception as exc:
+                for *_, futuro in pedidos:
+                    if not futuro.done():
+                        futuro.set_exception(exc)
+
+    def _processar(self, pedidos):
+        catalogo = {r["id"]: r for r in carregar_recompensas()}
+        hoje = datetime.date.today()
+        lote = self._novo_lote()
+        respostas = []   # (futuro, resultado)
+        registros = []   # linhas novas de resgates.csv
+        alteracoes = []
+        with _USERS_LOCK:
+            users = {}
+            for op, dados, futuro in pedidos:
+                try:
+                    self._processar_pedido(op, dados, futuro, catalogo, hoje, lote, users,
+                                           respostas, registros, alteracoes)
+                except (KeyError, ValueError, TypeError) as exc:
+                    futuro.set_exception(exc)  # pedido malformado (ex.: alteração remota): só ele falha
+            if registros:
+                salvar_usuarios_dict(users)
+                novo = not os.path.exists(REDEMPTIONS_FILE)
+                with open(REDEMPTIONS_FILE, "a", newline="", encoding="utf-8") as f:
+                    writer = csv.writer(f)
+                    if novo:
+                        writer.writerow(["chave", "email", "reward_id", "data", "periodo", "status", "mensagem"])
+                    writer.writerows(registros)
+                    f.flush()
+                    os.fsync(f.fileno())
+            self._efetivar(lote)  # só depois de gravado: uma falha acima não consome estoque
+        for futuro, resultado in respostas:
+            futuro.set_result(resultado)
+        for dados in alteracoes:
+            registrar_alteracao("resgate", dados)
+
+    def _processar_pedido(self, op, dados, futuro, catalogo, hoje, lote, users, respostas, registros, alteracoes):
+        # lê e valida tudo antes de alterar o usuário: se algo faltar, o lote segue sem este pedido
+        email = dados[0] if op == "resgate" else dados[0]["email"]
+        if email not in users:
+            users.update(carregar_usuarios(email))
+        u = users.get(email)
+        if op == "resgate":
+            _, reward_id, chave = dados
+            anterior = self._resultado_com(lote, chave)
+            if anterior is not None:
+                respostas.append((futuro, anterior))  # mesma tentativa reenviada
+                return
+            rec = catalogo.get(reward_id)
+            resultado, periodo = self._validar(lote, u, rec, reward_id, hoje)
+            if resultado[0]:
+                u.pontos -= rec["custo_pontos"]
+                u.rewards[reward_id] = None
+                self._marcar(lote, chave, email, reward_id, periodo, resultado[1])
+                registros.append([chave, email, reward_id, hoje.isoformat(), periodo, "ok", resultado[1]])
+                # estoque/limite vão junto para o servidor recusar o que passar do total entre máquinas
+                alteracoes.append({"email": email, "reward_id": reward_id, "custo": rec["custo_pontos"],
+                                   "chave": chave, "data": hoje.isoformat(), "periodo": periodo,
+                                   "estoque": rec["estoque"], "limite_periodo": rec["limite_periodo"]})
+            respostas.append((futuro, resultado))
+        elif op == "remoto":
+            d, chave = dados
+            reward_id, custo = d["reward_id"], int(d["custo"])
+            chave = d.get("chave") or chave
+            if u is not None and reward_id not in u.rewards:
+                rec = catalogo.get(reward_id)
+                periodo = d.get("periodo")
+                if periodo is None:
+                    periodo = _chave_periodo(rec["periodo"], hoje) if rec else ""
+                u.pontos -= custo
+                u.rewards[reward_id] = None
+                self._marcar(lote, chave, email, reward_id, periodo, "")
+                registros.append([chave, email, reward_id, d.get("data") or hoje.isoformat(), periodo, "ok", ""])
+            respostas.append((futuro, None))
+        else:  # estorno
+            d, _ = dados
+            reward_id, custo = d["reward_id"], int(d["custo"])
+            if u is not None and reward_id in u.rewards:
+                del u.rewards[reward_id]
+                u.pontos += custo
+                ativo = self._desmarcar(lote, email, reward_id)
+                if ativo is not None:
+                    registros.append([ativo[0], email, reward_id, hoje.isoformat(), ativo[1], "estorno", ""])
+            respostas.append((futuro, None))
+
+    def _validar(self, lote, u, recompensa, reward_id, hoje):
+        if u is None:
+            return (False, "Usuário não encontrado."), ""
+        if not recompensa:
+            return (False, "Recompensa inválida."), ""
+        periodo = _chave_periodo(recompensa["periodo"], hoje)
+        # verifica nivel
+        if u.nivel.ordem < Nivel.de_texto(recompensa["nivel"]).ordem:
+            return (False, f"Recompensa disponível apenas para nível {recompensa['nivel']} ou superior."), periodo
+        if u.pontos < recompensa["custo_pontos"]:
+            return (False, "Pontos insuficientes para resgatar essa recompensa."), periodo
+        # verifica se já resgatou
+        if usuario_tem_resgatado(u, reward_id):
+            return (False, "Você já resgatou essa recompensa."), periodo
+        if recompensa["estoque"] is not None and self._emitidos_com(lote, reward_id) >= recompensa["estoque"]:
+            return (False, "Recompensa esgotada."), periodo
+        if recompensa["limite_periodo"] is not None and periodo and \
+                self._no_periodo_com(lote, reward_id, periodo) >= recompensa["limite_periodo"]:
+            return (False, f"Limite de resgates desta recompensa no(a) {recompensa['periodo']} atingido. Tente no próximo período."), periodo
+        return (True, f"Recompensa '{recompensa['titulo']}' resgatada! -{recompensa['custo_pontos']} pts"), periodo
+
+motor_resgates = MotorResgates()
+
+def resgatar_recompensa_para_usuario(usuario_email, reward_id, chave=None):
+    return motor_resgates.enviar(usuario_email, reward_id, chave).result()
+
+# -------- Moderação ----------
+def eh_moderador(email):
+    try:
+        with open(MODERATORS_FILE, "r", encoding="utf-8") as f:
+            return any(row.get("email", "").strip() == email for row in csv.DictReader(f))
+    except FileNotFoundError:
         return False
-    return reward_id in [r for r in rewards.split(";") if r]
 
-def resgatar_recompensa_para_usuario(usuario_email, reward_id):
-    users = carregar_usuarios()
-    if usuario_email not in users:
-        return False, "Usuário não encontrado."
-    u = users[usuario_email]
-    recompensa = obter_recompensa_por_id(reward_id)
-    if not recompensa:
-        return False, "Recompensa inválida."
-    pontos = int(u.get("pontos", "0"))
-    # verifica nivel
-    nivel_usuario = u.get("nivel","Básico")
-    niveis_ordem = {"Básico": 0, "Intermediário": 1, "Avançado": 2}
-    if niveis_ordem.get(nivel_usuario,0) < niveis_ordem.get(recompensa["nivel"],0):
-        return False, f"Recompensa disponível apenas para nível {recompensa['nivel']} ou superior."
-    if pontos < recompensa["custo_pontos"]:
-        return False, "Pontos insuficientes para resgatar essa recompensa."
-    # verifica se já resgatou
-    if usuario_tem_resgatado(u, reward_id):
-        return False, "Você já resgatou essa recompensa."
-    # desconta pontos e marca recomp
-    u["pontos"] = str(pontos - recompensa["custo_pontos"])
-    existing = u.get("rewards", "")
-    if existing and existing.strip():
-        u["rewards"] = existing + ";" + reward_id
+# -------- Busca nos relatórios (índice invertido) ----------
+# O índice fica em disco como postings "termo,id" (id do registro de progresso, ver id_registro).
+# Ele só cresce: salvar_progresso acrescenta os termos do relatório novo, e a memória
+# carrega apenas o trecho do arquivo que ainda não foi lido.
+# Cada relatório também ganha um posting "#<hash do texto normalizado>", usado para achar
+# cópias idênticas sem depender da busca por palavras (ver relatorios_identicos).
+_INDICE_CABECALHO = "termo,id,v2\n"  # v2: inclui as assinaturas "#hash"; versões anteriores são recriadas
+_indice_lock = threading.RLock()          # estrutura em memória (UI, sincronização e carga inicial)
+_indice_arquivo_lock = threading.RLock()  # escrita no arquivo; separada para o concluir não esperar a carga
+
+def _indice_vazio():
+    # textos: hash -> ids; ultimo: shard -> maior offset indexado; arquivo: identidade do arquivo lido
+    return {"termos": {}, "ordenados": [], "textos": {}, "lido_ate": 0, "ultimo": {}, "arquivo": None}
+
+_indice = _indice_vazio()
+
+def tokenizar(texto):
+    texto = unicodedata.normalize("NFKD", texto.lower())
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    return re.findall(r"[a-z0-9]+", texto)
+
+def assinatura_relatorio(relatorio):
+    """Hash do relatório normalizado (mesmas palavras na mesma ordem, sem acento/pontuação)."""
+    return hashlib.md5(" ".join(tokenizar(relatorio)).encode("utf-8")).hexdigest()
+
+def _postings_relatorio(rid, relatorio):
+    postings = [(t, rid) for t in sorted(set(tokenizar(relatorio)))]
+    postings.append(("#" + assinatura_relatorio(relatorio), rid))
+    return postings
+
+def _gravar_postings(postings):
+    with _indice_arquivo_lock:
+        novo = not os.path.exists(SEARCH_INDEX_FILE)
+        with open(SEARCH_INDEX_FILE, "a", encoding="utf-8", newline="") as f:
+            if novo:
+                f.write(_INDICE_CABECALHO)
+            f.writelines(f"{termo},{rid}\n" for termo, rid in postings)
+
+def indexar_relatorio(rid, relatorio):
+    with _indice_arquivo_lock:
+        if not os.path.exists(SEARCH_INDEX_FILE):
+            reconstruir_indice_relatorios()  # já inclui o registro recém-gravado
+            return
+        _gravar_postings(_postings_relatorio(rid, relatorio))
+
+def reconstruir_indice_relatorios():
+    """Recria o índice inteiro a partir dos shards de progresso (primeira execução, resharding ou arquivo apagado)."""
+    with _indice_arquivo_lock:
+        tmp = SEARCH_INDEX_FILE + ".tmp"
+        with open(tmp, "w", encoding="utf-8", newline="") as f:
+            f.write(_INDICE_CABECALHO)
+            for rid, r in iterar_progresso():
+                f.writelines(f"{t},{i}\n" for t, i in _postings_relatorio(rid, r["relatorio"]))
+        os.replace(tmp, SEARCH_INDEX_FILE)
+    # a memória é descartada por _atualizar_indice ao ver que o arquivo mudou
+
+def _indice_na_versao_atual():
+    try:
+        with open(SEARCH_INDEX_FILE, "r", encoding="utf-8", newline="") as f:
+            return f.readline() == _INDICE_CABECALHO
+    except FileNotFoundError:
+        return False
+
+def _adicionar_posting(termo, rid, novos):
+    if termo.startswith("#"):
+        _indice["textos"].setdefault(termo[1:], []).append(rid)
     else:
-        u["rewards"] = reward_id
-    # opcional: ao resgatar, conceder um badge extra? (não por enquanto)
-    users[usuario_email] = u
-    salvar_usuarios_dict(users)
-    return True, f"Recompensa '{recompensa['titulo']}' resgatada! -{recompensa['custo_pontos']} pts"
+        termos = _indice["termos"]
+        if termo not in termos:
+            termos[termo] = []
+            novos.append(termo)  # entra em "ordenados" de uma vez no fim da leitura
+        termos[termo].append(rid)
+    shard, off = separar_id(rid)
+    if off > _indice["ultimo"].get(shard, -1):
+        _indice["ultimo"][shard] = off
+
+def _atualizar_indice():
+    with _indice_lock:
+        with _indice_arquivo_lock:
+            if not _indice_na_versao_atual():
+                reconstruir_indice_relatorios()
+        with open(SEARCH_INDEX_FILE, "rb") as f:
+            info = os.fstat(f.fileno())
+            arquivo = (info.st_dev, info.st_ino)
+            if arquivo != _indice["arquivo"] or info.st_size < _indice["lido_ate"]:
+                # arquivo foi recriado (reconstrução, resharding, restauração): recomeça do zero
+                _indice.clear()
+                _indice.update(_indice_vazio())
+                _indice["arquivo"] = arquivo
+            f.seek(_indice["lido_ate"])
+            bloco = f.read(info.st_size - _indice["lido_ate"])
+        fim = bloco.rfind(b"\n") + 1  # ignora linha parcial (escrita em andamento)
+        novos = []
+        for linha in bloco[:fim].decode("utf-8").splitlines():
+            termo, _, off = linha.partition(",")
+            if off.isdigit():
+                _adicionar_posting(termo, int(off), novos)
+        if novos:
+            # um merge só (o sort junta as duas sequências já ordenadas) em vez de um insort por termo
+            novos.sort()
+            _indice["ordenados"] = sorted(_indice["ordenados"] + novos)
+        _indice["lido_ate"] += fim
+        # registros gravados sem chegar ao índice (ex.: app fechado no meio) são indexados agora
+        pendentes = []
+        for shard in range(_config_shards()["n"]):
+            ultimo = _indice["ultimo"].get(shard, -1)
+            for off, r in iterar_progresso_shard(shard, max(ultimo, 0)):
+                if off > ultimo:
+                    pendentes.extend(_postings_relatorio(id_registro(shard, off), r["relatorio"]))
+        if pendentes:
+            _gravar_postings(pendentes)
+            _atualizar_indice()
+
+def carregar_indice_em_segundo_plano():
+    """Lê o índice numa thread ao abrir o app, para a primeira busca/concluir não pagar a carga inteira."""
+    t = threading.Thread(target=_atualizar_indice, daemon=True)
+    t.start()
+    return t
+
+def relatorios_identicos(relatorio):
+    """(id do registro, registro) de todos os relatórios com o mesmo texto normalizado, de qualquer usuário."""
+    with _indice_lock:
+        _atualizar_indice()
+        ids = list(_indice["textos"].get(assinatura_relatorio(relatorio), ()))
+    return ler_progresso_por_id(ids)
+
+def buscar_relatorios(consulta, limite=200):
+    """
+    Busca por palavras nos relatórios de todos os usuários.
+    Cada termo precisa aparecer no relatório; termos terminados em '*' funcionam como prefixo.
+    Retorna [(id do registro, registro)] do mais recente para o mais antigo.
+    """
+    with _indice_lock:
+        _atualizar_indice()
+        resultado = None
+        for termo_bruto in consulta.split():
+            prefixo = termo_bruto.endswith("*")
+            termos = tokenizar(termo_bruto)
+            if not termos:
+                continue
+            for i, termo in enumerate(termos):
+                if prefixo and i == len(termos) - 1:
+                    ordenados = _indice["ordenados"]
+                    encontrados = set()
+                    pos = bisect.bisect_left(ordenados, termo)
+                    while pos < len(ordenados) and ordenados[pos].startswith(termo):
+                        encontrados.update(_indice["termos"][ordenados[pos]])
+                        pos += 1
+                else:
+                    encontrados = set(_indice["termos"].get(termo, ()))
+                resultado = encontrados if resultado is None else resultado & encontrados
+                if not resultado:
+                    return []
+    if not resultado:
+        return []
+    # o id só cresce dentro de cada shard (ordem de gravação): pega os `limite` mais novos de cada
+    # shard e só então ordena por data, já que comparar ids de shards diferentes não diz nada
+    por_shard = {}
+    for rid in resultado:
+        por_shard.setdefault(separar_id(rid)[0], []).append(rid)
+    candidatos = [rid for ids in por_shard.values() for rid in sorted(ids, reverse=True)[:limite]]
+    registros = ler_progresso_por_id(candidatos)
+    return sorted(registros, key=lambda item: (item[1]["data"], item[0]), reverse=True)[:limite]
+
+# -------- Análise de relatórios suspeitos (lote offline) ----------
+# Roda fora do app: python "APS_Projeto Green+.py" --analisar-relatorios [processos]
+# Cada relatório recebe uma pontuação de "texto sem sentido" e uma assinatura MinHash;
+# relatórios quase iguais (mesmo usuário ou contas diferentes) são agrupados via LSH.
+# O resultado vai para relatorios_sinalizados.csv, que o app usa para ocultar/recusar entradas.
+MINHASH_PERMS = 64
+LSH_BANDAS = 16  # 16 bandas x 4 linhas -> pares com similaridade ~0.8 quase sempre colidem
+SIMILARIDADE_DUPLICADO = 0.8
+_MINHASH_PRIMO = (1 << 61) - 1
+_rng_minhash = random.Random(20251031)  # semente fixa: assinaturas comparáveis entre execuções
+_MINHASH_COEF = [(_rng_minhash.randrange(1, _MINHASH_PRIMO), _rng_minhash.randrange(0, _MINHASH_PRIMO)) for _ in range(MINHASH_PERMS)]
+
+def entropia_caracteres(texto):
+    if not texto:
+        return 0.0
+    contagem = {}
+    for c in texto:
+        contagem[c] = contagem.get(c, 0) + 1
+    n = len(texto)
+    return -sum((k / n) * math.log2(k / n) for k in contagem.values())
+
+def pontuar_relatorio(texto):
+    """Retorna (pontuação 0..1, motivos) indicando o quanto o relatório parece texto sem sentido."""
+    palavras = tokenizar(texto)
+    junto = "".join(palavras)
+    if len(junto) < 6:
+        return 1.0, ["relatório curto demais"]
+    motivos = []
+    letras = [c for c in junto if c.isalpha()]
+    vogais = sum(1 for c in letras if c in "aeiou")
+    if letras and vogais / len(letras) < 0.25:
+        motivos.append("poucas vogais")
+    if any(re.search(r"[a-z]", p) and re.search(r"[0-9]", p) and len(p) > 4 for p in palavras):
+        motivos.append("letras e números misturados")
+    if max(len(p) for p in palavras) > 20:
+        motivos.append("palavra longa demais")
+    ent = entropia_caracteres(junto)
+    if len(junto) >= 12 and ent < 2.0:
+        motivos.append("texto repetitivo")
+    if len(palavras) == 1 and len(junto) > 8:
+        motivos.append("palavra única")
+    return min(1.0, 0.4 * len(motivos)), motivos
+
+def _minhash(texto_normalizado, k=5):
+    if len(texto_normalizado) <= k:
+        shingles = {texto_normalizado}
+    else:
+        shingles = {texto_normalizado[i:i + k] for i in range(len(texto_normalizado) - k + 1)}
+    hashes = [zlib.crc32(sh.encode("utf-8")) for sh in shingles]
+    return tuple(min((a * h + b) % _MINHASH_PRIMO for h in hashes) for a, b in _MINHASH_COEF)
+
+def _analisar_lote(lote):
+    # executado nos processos do pool: só cálculo, sem acesso a arquivos
+    saida = []
+    for off, email, data, texto in lote:
+        normalizado = " ".join(tokenizar(texto))
+        score, motivos = pontuar_relatorio(texto)
+        assinatura = _minhash(normalizado) if len(normalizado) >= 10 else None
+        saida.append((off, email, data, normalizado, score, motivos, assinatura))
+    return saida
+
+def _lotes_progresso(tamanho=5000):
+    lote = []
+    for rid, r in iterar_progresso():
+        lote.append((rid, r["email"], r["data"], r["relatorio"]))
+        if len(lote) >= tamanho:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+def analisar_relatorios(processos=None):
+    """Gera relatorios_sinalizados.csv. Retorna a quantidade de relatórios sinalizados."""
+    registros = {}    # off -> (email, data, score, motivos)
+    por_texto = {}    # texto normalizado -> [offs] (duplicatas exatas)
+    assinaturas = {}  # texto normalizado -> minhash
+    with multiprocessing.Pool(processos) as pool:
+        for resultado in pool.imap(_analisar_lote, _lotes_progresso()):
+            for off, email, data, normalizado, score, motivos, assinatura in resultado:
+                registros[off] = (email, data, score, motivos)
+                por_texto.setdefault(normalizado, []).append(off)
+                if assinatura is not None:
+                    assinaturas[normalizado] = assinatura
+
+    # agrupa textos quase iguais: LSH nos textos distintos + union-find
+    pai = {t: t for t in assinaturas}
+    def raiz(t):
+        while pai[t] != t:
+            pai[t] = pai[pai[t]]
+            t = pai[t]
+        return t
+    linhas = MINHASH_PERMS // LSH_BANDAS
+    for banda in range(LSH_BANDAS):
+        baldes = {}
+        for t, assinatura in assinaturas.items():
+            chave = assinatura[banda * linhas:(banda + 1) * linhas]
+            rep = baldes.setdefault(chave, t)
+            if rep is t:
+                continue
+            a, b = raiz(rep), raiz(t)
+            if a == b:
+                continue
+            iguais = sum(x == y for x, y in zip(assinaturas[rep], assinatura))
+            if iguais / MINHASH_PERMS >= SIMILARIDADE_DUPLICADO:
+                pai[b] = a
+
+    grupos = {}
+    for normalizado, offs in por_texto.items():
+        chave = raiz(normalizado) if normalizado in pai else normalizado
+        grupos.setdefault(chave, []).extend(offs)
+
+    motivos_por_off = {off: list(r[3]) for off, r in registros.items()}
+    scores = {off: r[2] for off, r in registros.items()}
+    for offs in grupos.values():
+        if len(offs) < 2:
+            continue
+        # o primeiro (mais antigo) é tratado como original; o id só ordena dentro do mesmo shard,
+        # então a data vem antes (o id desempata no mesmo dia)
+        offs.sort(key=lambda o: (registros[o][1], o))
+        emails = {registros[o][0] for o in offs}
+        motivo = "texto repetido entre contas" if len(emails) > 1 else "relatório repetido"
+        for o in offs[1:]:
+            motivos_por_off[o].append(motivo)
+            scores[o] = 1.0
+
+    tmp = FLAGS_FILE + ".tmp"
+    total = 0
+    with open(tmp, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["id", "email", "data", "score", "motivos"])
+        for off in sorted(registros):
+            if scores[off] >= 0.5:
+                email, data, _, _ = registros[off]
+                writer.writerow([off, email, data, f"{scores[off]:.2f}", "; ".join(motivos_por_off[off])])
+                total += 1
+    os.replace(tmp, FLAGS_FILE)
+    return total
+
+_sinalizados_cache = {"mtime": None, "dados": {}}
+
+def carregar_sinalizados():
+    """{id do registro: motivos} dos relatórios sinalizados pela última análise (em cache até o arquivo mudar)."""
+    try:
+        mtime = os.path.getmtime(FLAGS_FILE)
+    except OSError:
+        return {}
+    if _sinalizados_cache["mtime"] != mtime:
+        with open(FLAGS_FILE, "r", encoding="utf-8") as f:
+            _sinalizados_cache["dados"] = {int(r["id"]): r["motivos"] for r in csv.DictReader(f)}
+        _sinalizados_cache["mtime"] = mtime
+    return _sinalizados_cache["dados"]
+
+def validar_relatorio_novo(email, texto):
+    """Checagem rápida feita no concluir. Retorna mensagem de erro ou None."""
+    score, motivos = pontuar_relatorio(texto)
+    if score >= 0.5:
+        return "O relatório parece inválido (" + ", ".join(motivos) + "). Descreva a atividade realizada."
+    palavras = tokenizar(texto)
+    if len(palavras) >= 3:
+        # assinaturas guardadas no índice: acha todas as cópias, não só as que caberiam numa busca
+        normalizado = " ".join(palavras)
+        de_outro = False
+        for _, r in relatorios_identicos(texto):
+            if " ".join(tokenizar(r["relatorio"])) != normalizado:
+                continue  # colisão de hash
+            if r["email"] == email:
+                return "Você já enviou um relatório idêntico. Descreva a atividade de hoje."
+            de_outro = True
+        if de_outro:
+            return "Este relatório é idêntico ao de outro usuário. Escreva o seu próprio relatório."
+    return None
+
+# -------- Analytics administrativo ----------
+# Roda fora do app: python "APS_Projeto Green+.py" --analytics [processos]
+# Cada shard de progresso é lido num processo separado, que guarda em cache os agregados do
+# shard por mês e até onde (em bytes) já leu. Como o progresso só cresce, na execução seguinte
+# cada processo lê só o que foi acrescentado ao seu shard; shards sem linhas novas nem são abertos.
+# Um email fica sempre no mesmo shard, então os agregados dos shards somam sem contar ninguém duas vezes.
+def _mes_vazio():
+    return {"pontos_por_tarefa": {}, "tarefas_concluidas": {}, "ativos_por_dia": {}, "primeira_atividade": {}}
+
+def _codificar(valores):
+    """(valores distintos, array com a posição de cada valor entre eles), sem laço Python por linha."""
+    distintos = list(dict.fromkeys(valores))
+    posicao = {v: i for i, v in enumerate(distintos)}
+    return distintos, np.fromiter(map(posicao.__getitem__, valores), dtype=np.int64, count=len(valores))
+
+def _agregar_trecho(meses, emails, datas, tarefas, pontos):
+    """Soma ao cache `meses` as linhas novas de um shard (uma lista por coluna). Retorna os meses alterados."""
+    email_l, email_c = _codificar(emails)
+    data_l, data_c = _codificar(datas)
+    tarefa_l, tarefa_c = _codificar(tarefas)
+    # recodifica as datas em ordem cronológica (ISO ordena como texto): menor código = data mais antiga
+    ordem = sorted(range(len(data_l)), key=data_l.__getitem__)
+    posicao = np.empty(len(ordem), dtype=np.int64)
+    posicao[ordem] = np.arange(len(ordem))
+    data_c = posicao[data_c]
+    data_l = [data_l[i] for i in ordem]
+    mes_l = sorted({d[:7] for d in data_l})
+    indice_mes = {m: i for i, m in enumerate(mes_l)}
+    mes_c = np.array([indice_mes[d[:7]] for d in data_l], dtype=np.int64)[data_c]
+    nt, ne = len(tarefa_l), len(email_l)
+    for mes in mes_l:
+        meses.setdefault(mes, _mes_vazio())
+
+    # pontos e quantidade por (mês, tarefa)
+    chave = mes_c * nt + tarefa_c
+    soma = np.bincount(chave, weights=np.array(pontos, dtype=np.float64), minlength=len(mes_l) * nt)
+    qtd = np.bincount(chave, minlength=len(mes_l) * nt)
+    for k in np.flatnonzero(qtd).tolist():
+        ag, tarefa = meses[mes_l[k // nt]], tarefa_l[k % nt]
+        ag["pontos_por_tarefa"][tarefa] = ag["pontos_por_tarefa"].get(tarefa, 0) + int(soma[k])
+        ag["tarefas_concluidas"][tarefa] = ag["tarefas_concluidas"].get(tarefa, 0) + int(qtd[k])
+
+    # usuários distintos por dia: pares (data, email) únicos, já ordenados por data
+    pares = np.unique(data_c * ne + email_c)
+    dias = pares // ne
+    cortes = np.flatnonzero(np.diff(dias)) + 1
+    for d, grupo in zip(dias[np.r_[0, cortes]].tolist(), np.split(pares % ne, cortes)):
+        data = data_l[d]
+        ag = meses[data[:7]]
+        do_dia = ag["ativos_por_dia"].get(data)
+        if not isinstance(do_dia, set):  # lista vinda do cache vira set enquanto o shard é lido
+            do_dia = ag["ativos_por_dia"][data] = set(do_dia or ())
+        do_dia.update(map(email_l.__getitem__, grupo.tolist()))
+
+    # primeira atividade de cada usuário no mês: menor código de data por (mês, email)
+    chave = mes_c * ne + email_c
+    ordem = np.lexsort((data_c, chave))
+    chaves, inicio = np.unique(chave[ordem], return_index=True)
+    primeiras = data_c[ordem][inicio]
+    for k, d in zip(chaves.tolist(), primeiras.tolist()):
+        primeira = meses[mes_l[k // ne]]["primeira_atividade"]
+        email, data = email_l[k % ne], data_l[d]
+        if email not in primeira or data < primeira[email]:
+            primeira[email] = data
+    return mes_l
+
+def _agregar_shard(args):
+    shard, config = args
+    progresso = arquivo_progresso_shard(shard, config)
+    cache_path = os.path.join(ANALYTICS_CACHE_DIR, f"shard_g{config['geracao']}_{shard:02d}.json")
+    try:
+        tamanho = os.path.getsize(progresso)
+    except OSError:
+        tamanho = 0
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            cache = json.load(f)
+    except (FileNotFoundError, ValueError):
+        cache = {"lido_ate": 0, "meses": {}}
+    if tamanho < cache["lido_ate"]:
+        cache = {"lido_ate": 0, "meses": {}}  # arquivo menor que o lido: foi substituído (ex.: restauração)
+    if tamanho == cache["lido_ate"]:
+        return shard, cache_path, []
+    # o trecho novo é lido em colunas e agregado de uma vez com numpy (ver _agregar_trecho)
+    emails, datas, tarefas, pontos = [], [], [], []
+    for _, r in _iterar_arquivo_progresso(progresso, cache["lido_ate"], tamanho):
+        if not r.get("data"):
+            continue
+        try:
+            pontos.append(int(r["pontos"]))
+        except (TypeError, ValueError):
+            pontos.append(0)
+        emails.append(r["email"])
+        datas.append(r["data"])
+        tarefas.append(r["tarefa"])
+    alterados = _agregar_trecho(cache["meses"], emails, datas, tarefas, pontos) if pontos else []
+    cache["lido_ate"] = tamanho
+    tmp = cache_path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(cache, f, ensure_ascii=False, default=sorted)  # sets dos dias voltam a ser listas
+    os.replace(tmp, cache_path)
+    return shard, cache_path, alterados
+
+def _mes_seguinte(mes, n=1):
+    ano, m = int(mes[:4]), int(mes[5:7])
+    total = ano * 12 + (m - 1) + n
+    return f"{total // 12:04d}-{total % 12 + 1:02d}"
+
+def gerar_analytics(processos=None):
+    """Calcula as métricas administrativas e exporta CSV/JSON em data/analytics. Retorna o resumo."""
+    os.makedirs(ANALYTICS_CACHE_DIR, exist_ok=True)
+    config = _config_shards()
+    with multiprocessing.Pool(processos) as pool:
+        resultados = pool.map(_agregar_shard, [(shard, config) for shard in range(config["n"])])
+    # caches de gerações antigas (antes de um resharding) não valem mais
+    atuais = {os.path.basename(caminho) for _, caminho, _ in resultados}
+    for nome in os.listdir(ANALYTICS_CACHE_DIR):
+        if nome.endswith(".json") and nome not in atuais:
+            os.remove(os.path.join(ANALYTICS_CACHE_DIR, nome))
+    alterados = sorted({mes for _, _, meses in resultados for mes in meses})
+
+    # junta os shards
+    pontos_tarefa, qtd_tarefa, ativos_dia = {}, {}, {}
+    primeira, ativos_mes = {}, {}
+    for _, caminho, _ in resultados:
+        if not os.path.exists(caminho):
+            continue  # shard sem progresso
+        with open(caminho, "r", encoding="utf-8") as f:
+            meses = json.load(f)["meses"]
+        for mes, ag in meses.items():
+            for t, v in ag["pontos_por_tarefa"].items():
+                pontos_tarefa[t] = pontos_tarefa.get(t, 0) + v
+            for t, v in ag["tarefas_concluidas"].items():
+                qtd_tarefa[t] = qtd_tarefa.get(t, 0) + v
+            for d, emails in ag["ativos_por_dia"].items():
+                ativos_dia[d] = ativos_dia.get(d, 0) + len(emails)
+            ativos_mes.setdefault(mes, set()).update(ag["primeira_atividade"])
+            for email, data in ag["primeira_atividade"].items():
+                if email not in primeira or data < primeira[email]:
+                    primeira[email] = data
+
+    # retenção por coorte: coorte = mês da primeira atividade
+    coortes = {}
+    for email, data in primeira.items():
+        coortes.setdefault(data[:7], set()).add(email)
+    ultimo_mes = max(ativos_mes) if ativos_mes else None
+    retencao = {}
+    for coorte, membros in sorted(coortes.items()):
+        linha = []
+        k = 0
+        while _mes_seguinte(coorte, k) <= ultimo_mes:
+            ativos = ativos_mes.get(_mes_seguinte(coorte, k), set())
+            linha.append(round(len(membros & ativos) / len(membros), 4))
+            k += 1
+        retencao[coorte] = {"usuarios": len(membros), "retencao": linha}
+
+    # níveis e resgates vêm do cadastro atual
+    users = carregar_usuarios()
+    niveis = {}
+    resgates = {}
+    com_resgate = 0
+    for u in users.values():
+        niveis[u.nivel.value] = niveis.get(u.nivel.value, 0) + 1
+        if u.rewards:
+            com_resgate += 1
+        for rid in u.rewards:
+            resgates[rid] = resgates.get(rid, 0) + 1
+    total_usuarios = len(users)
+    taxa = {rid: round(n / total_usuarios, 4) for rid, n in resgates.items()} if total_usuarios else {}
+
+    resumo = {
+        "gerado_em": datetime.datetime.now().isoformat(timespec="seconds"),
+        "meses_recalculados": alterados,
+        "pontos_por_tarefa": pontos_tarefa,
+        "tarefas_concluidas": qtd_tarefa,
+        "usuarios_ativos_por_dia": dict(sorted(ativos_dia.items())),
+        "distribuicao_niveis": niveis,
+        "resgates": {"por_recompensa": resgates, "taxa_por_recompensa": taxa,
+                     "usuarios_com_resgate": com_resgate, "total_usuarios": total_usuarios},
+        "retencao_coortes": retencao,
+    }
+    with open(os.path.join(ANALYTICS_DIR, "resumo.json"), "w", encoding="utf-8") as f:
+        json.dump(resumo, f, ensure_ascii=False, indent=2)
+    def exportar(nome, cabecalho, linhas):
+        with open(os.path.join(ANALYTICS_DIR, nome), "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(cabecalho)
+            writer.writerows(linhas)
+    exportar("pontos_por_tarefa.csv", ["tarefa", "pontos", "concluidas"],
+             [(t, pontos_tarefa[t], qtd_tarefa.get(t, 0)) for t in sorted(pontos_tarefa)])
+    exportar("usuarios_ativos_dia.csv", ["data", "usuarios_ativos"], sorted(ativos_dia.items()))
+    exportar("niveis.csv", ["nivel", "usuarios"], sorted(niveis.items()))
+    exportar("resgates.csv", ["recompensa", "resgates", "taxa"],
+             [(rid, n, taxa.get(rid, 0)) for rid, n in sorted(resgates.items())])
+    exportar("retencao_coortes.csv", ["coorte", "usuarios"] + [f"mes_{k}" for k in range(max((len(r["retencao"]) for r in retencao.values()), default=0))],
+             [[c, r["usuarios"]] + r["retencao"] for c, r in retencao.items()])
+    return resumo
+
+# -------- Sincronização com o servidor central ----------
+# Cada máquina trabalha sobre a própria pasta data/ e registra o que mudou em alteracoes.jsonl.
+# Uma thread envia as alterações novas (a partir do último offset enviado) e busca as das outras
+# máquinas (a partir do último cursor do servidor). O servidor numera tudo numa sequência única:
+# pontos são somas de deltas (a ordem não muda o resultado) e, para resgates, vale o primeiro que
+# chegar ao servidor; o resgate recusado é desfeito na máquina de origem (pontos devolvidos).
+# Cadastro e senha também: o servidor aceita só o primeiro cadastro de cada email e só a troca de
+# senha feita a partir da senha atual dele ("anterior"). Essas alterações são aplicadas na ordem do
+# servidor em todas as máquinas, inclusive na de origem, e a recusada é sobrescrita pela aceita.
+# Servidor local para testes: python "APS_Projeto Green+.py" --servidor-sync [porta] [pasta]
+_sync_lock = threading.Lock()
+
+def _ler_estado_sync():
+    try:
+        with open(SYNC_STATE_FILE, "r", encoding="utf-8") as f:
+            estado = json.load(f)
+    except (FileNotFoundError, ValueError):
+        estado = {}
+    if "no" not in estado:
+        estado.update({"no": uuid.uuid4().hex, "servidor": "", "enviado_ate": 0, "cursor": 0})
+        _gravar_estado_sync(estado)
+    return estado
+
+def _gravar_estado_sync(estado):
+    tmp = SYNC_STATE_FILE + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(estado, f, indent=2)
+    os.replace(tmp, SYNC_STATE_FILE)
+
+def registrar_alteracao(tipo, dados):
+    with _sync_lock:
+        alteracao = {"id": uuid.uuid4().hex, "no": _ler_estado_sync()["no"], "tipo": tipo,
+                     "dados": dados, "ts": datetime.datetime.now().isoformat(timespec="seconds")}
+        with open(CHANGELOG_FILE, "a", encoding="utf-8") as f:
+            f.write(json.dumps(alteracao, ensure_ascii=False) + "\n")
+
+def aplicar_alteracao_remota(alteracao):
+    """
+    Aplica em data/ uma alteração vinda do servidor (sem registrá-la de novo no log local).
+    Cadastro e senha chegam também da própria máquina, para seguir a ordem do servidor.
+    """
+    tipo, d = alteracao["tipo"], alteracao["dados"]
+    if tipo == "grupo":
+        entrar_no_grupo(d["email"], d["grupo"], d["tipo"], registrar=False)
+        return
+    if tipo == "resgate":
+        # passa pelo motor de resgates para entrar em resgates.csv e na contagem do estoque
+        motor_resgates.aplicar_remoto(d, alteracao["id"]).result()
+        return
+    with _USERS_LOCK:
+        users = carregar_usuarios(d["email"])
+        u = users.get(d["email"])
+        if tipo == "usuario_novo":
+            if u is None:
+                users[d["email"]] = Usuario(d["email"], d["senha"], d["nome"])
+            else:
+                u.senha, u.nome = d["senha"], d["nome"]  # cadastro local duplicado e recusado: vale o aceito
+        elif u is None:
+            return  # conta ainda desconhecida aqui; não deveria ocorrer com a sequência do servidor
+        elif tipo == "senha":
+            u.senha = d["senha"]
+        elif tipo == "progresso":
+            creditar_pontos(u, int(d["pontos"]))
+        salvar_usuarios_dict(users)
+    if tipo == "progresso":
+        salvar_progresso(d["email"], d["tarefa"], d["pontos"], d["relatorio"], d["data"])
+        registrar_conquistas(d["email"])
+
+# valem pela ordem do servidor: reaplicadas mesmo quando a alteração é desta máquina
+_TIPOS_ORDEM_DO_SERVIDOR = ("usuario_novo", "senha")
+
+def _desfazer_resgate_recusado(alteracao):
+    motor_resgates.estornar(alteracao["dados"]).result()
+
+class Sincronizador:
+    """Thread que sincroniza data/ com o servidor central a cada `intervalo` segundos."""
+    def __init__(self, servidor, intervalo=15.0):
+        self.servidor = servidor.rstrip("/")
+        self.intervalo = intervalo
+        self.versao = 0  # incrementa quando alterações remotas são aplicadas (a UI observa)
+        self.online = False
+        self._parar = threading.Event()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+
+    def iniciar(self):
+        self._thread.start()
+
+    def parar(self):
+        self._parar.set()
+
+    def _requisicao(self, caminho, corpo=None):
+        dados = json.dumps(corpo).encode("utf-8") if corpo is not None else None
+        req = urllib.request.Request(self.servidor + caminho, data=dados,
+                                     headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(req, timeout=10) as resp:
+            return json.loads(resp.read().decode("utf-8"))
+
+    def _loop(self):
+        while not self._parar.is_set():
+            try:
+                self.sincronizar()
+                self.online = True
+            except OSError:
+                self.online = False  # sem rede/servidor: tenta de novo no próximo ciclo
+            except Exception:
+                self.online = False  # resposta inválida do servidor: a thread continua e tenta de novo
+            self._parar.wait(self.intervalo)
+
+    def sincronizar(self):
+        estado = _ler_estado_sync()
+        # 1) envia as alterações locais ainda não enviadas
+        while True:
+            lote, fim = [], estado["enviado_ate"]
+            try:
+                with open(CHANGELOG_FILE, "rb") as f:
+                    f.seek(fim)
+                    for linha in f:
+                        if not linha.endswith(b"\n"):
+                            break  # linha ainda sendo escrita
+                        lote.append(json.loads(linha))
+                        fim += len(linha)
+                        if len(lote) >= 500:
+                            break
+            except FileNotFoundError:
+                pass
+            if not lote:
+                break
+            resposta = self._requisicao("/alteracoes", {"alteracoes": lote})
+            recusadas = set(resposta.get("recusadas", []))
+            for alteracao in lote:
+                if alteracao["id"] in recusadas and alteracao["tipo"] == "resgate":
+                    _desfazer_resgate_recusado(alteracao)
+                    self.versao += 1
+            estado["enviado_ate"] = fim
+            _gravar_estado_sync(estado)
+        # 2) busca as alterações das outras máquinas
+        while True:
+            resposta = self._requisicao(f"/alteracoes?desde={estado['cursor']}")
+            alteracoes = resposta.get("alteracoes", [])
+            if not alteracoes:
+                break
+            for alteracao in alteracoes:
+                if alteracao["no"] != estado["no"] or alteracao["tipo"] in _TIPOS_ORDEM_DO_SERVIDOR:
+                    try:
+                        aplicar_alteracao_remota(alteracao)
+                    except (KeyError, ValueError, TypeError):
+                        pass  # alteração malformada: pula em vez de travar a sincronização nela
+                    self.versao += 1
+                # aplicar não é idempotente (pontos, linha de progresso): o cursor é gravado a cada
+                # alteração para que o app fechado no meio do lote não a aplique de novo
+                estado["cursor"] = alteracao["seq"]
+                _gravar_estado_sync(estado)
+
+def iniciar_sincronizacao():
+    """Liga a sincronização se houver servidor em sync.json ou em GREENPLUS_SYNC_URL."""
+    servidor = os.environ.get("GREENPLUS_SYNC_URL") or _ler_estado_sync().get("servidor")
+    if not servidor:
+        return None
+    sincronizador = Sincronizador(servidor)
+    sincronizador.iniciar()
+    return sincronizador
+
+class _ServidorCentral:
+    """Servidor de referência (suficiente para testes): guarda a sequência global em log.jsonl."""
+    def __init__(self, pasta):
+        os.makedirs(pasta, exist_ok=True)
+        self.log_path = os.path.join(pasta, "log.jsonl")
+        self.recusadas_path = os.path.join(pasta, "recusadas.txt")
+        self.lock = threading.Lock()
+        self.log, self.ids, self.resgates = [], set(), set()
+        self.emitidos, self.por_periodo = {}, {}  # resgates aceitos por recompensa e por (recompensa, período)
+        self.senhas = {}  # email -> senha atual (hash) segundo a sequência
+        if os.path.exists(self.log_path):
+            with open(self.log_path, "r", encoding="utf-8") as f:
+                for linha in f:
+                    self._indexar(json.loads(linha))
+        self.recusadas = set()
+        if os.path.exists(self.recusadas_path):
+            with open(self.recusadas_path, "r", encoding="utf-8") as f:
+                self.recusadas = {l.strip() for l in f if l.strip()}
+
+    def _indexar(self, alteracao):
+        self.log.append(alteracao)
+        self.ids.add(alteracao["id"])
+        if alteracao["tipo"] == "resgate":
+            d = alteracao["dados"]
+            self.resgates.add((d["email"], d["reward_id"]))
+            self.emitidos[d["reward_id"]] = self.emitidos.get(d["reward_id"], 0) + 1
+            k = (d["reward_id"], d.get("periodo") or "")
+            self.por_periodo[k] = self.por_periodo.get(k, 0) + 1
+        elif alteracao["tipo"] in ("usuario_novo", "senha"):
+            self.senhas[alteracao["dados"]["email"]] = alteracao["dados"]["senha"]
+
+    def _resgate_invalido(self, d):
+        # a mesma recompensa duas vezes, ou além do estoque/limite somando todas as máquinas
+        if (d["email"], d["reward_id"]) in self.resgates:
+            return True
+        if d.get("estoque") is not None and self.emitidos.get(d["reward_id"], 0) >= d["estoque"]:
+            return True
+        return d.get("limite_periodo") is not None and d.get("periodo") and \
+            self.por_periodo.get((d["reward_id"], d["periodo"]), 0) >= d["limite_periodo"]
+
+    def _recusar(self, alteracao):
+        tipo, d = alteracao["tipo"], alteracao["dados"]
+        if tipo == "resgate":
+            return self._resgate_invalido(d)
+        if tipo == "usuario_novo":
+            return d["email"] in self.senhas  # email já cadastrado em outra máquina
+        if tipo == "senha":
+            # troca feita sobre uma senha que já foi trocada em outra máquina (alterações antigas não têm "anterior")
+            return "anterior" in d and self.senhas.get(d["email"], d["anterior"]) != d["anterior"]
+        return False
+
+    def receber(self, alteracoes):
+        aceitas, recusadas = [], []
+        with self.lock, open(self.log_path, "a", encoding="utf-8") as log, \
+                open(self.recusadas_path, "a", encoding="utf-8") as rec:
+            for alteracao in alteracoes:
+                if alteracao["id"] in self.ids:
+                    aceitas.append(alteracao["id"])  # reenvio: já está na sequência
+                    continue
+                if alteracao["id"] in self.recusadas:
+                    recusadas.append(alteracao["id"])
+                    continue
+                if self._recusar(alteracao):
+                    self.recusadas.add(alteracao["id"])
+                    rec.write(alteracao["id"] + "\n")
+                    recusadas.append(alteracao["id"])
+                    continue
+                alteracao = dict(alteracao, seq=len(self.log) + 1)
+                log.write(json.dumps(alteracao, ensure_ascii=False) + "\n")
+                self._indexar(alteracao)
+                aceitas.append(alteracao["id"])
+        return {"aceitas": aceitas, "recusadas": recusadas}
+
+    def listar(self, desde, limite=500):
+        with self.lock:
+            return {"alteracoes": self.log[desde:desde + limite]}
+
+def servir_sincronizacao(porta=8765, pasta="servidor_sync"):
+    central = _ServidorCentral(pasta)
+
+    class Handler(BaseHTTPRequestHandler):
+        def _responder(self, corpo):
+            dados = json.dumps(corpo, ensure_ascii=False).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(dados)))
+            self.end_headers()
+            self.wfile.write(dados)
+
+        def do_GET(self):
+            url = urllib.parse.urlparse(self.path)
+            if url.path != "/alteracoes":
+                self.send_error(404)
+                return
+            desde = int(urllib.parse.parse_qs(url.query).get("desde", ["0"])[0])
+            self._responder(central.listar(desde))
+
+        def do_POST(self):
+            if self.path != "/alteracoes":
+                self.send_error(404)
+                return
+            corpo = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            self._responder(central.receber(corpo.get("alteracoes", [])))
+
+        def log_message(self, *args):
+            pass
+
+    servidor = ThreadingHTTPServer(("127.0.0.1", porta), Handler)
+    print(f"Servidor de sincronização em http://127.0.0.1:{porta} (dados em {pasta})")
+    servidor.serve_forever()
+
+# -------- Snapshots incrementais de data/ ----------
+# Cada arquivo é dividido em blocos de tamanho fixo; cada bloco é gravado uma única vez, comprimido,
+# com o sha256 como nome (snapshots/objetos/). Um snapshot é só um manifesto: arquivo -> lista de blocos.
+# Arquivos que só crescem (progresso, log de alterações, índice) não são relidos: os blocos completos
+# do snapshot anterior são reaproveitados e a leitura começa no último bloco incompleto.
+# Linha de comando: --snapshot | --listar-snapshots | --restaurar <id>
+SNAPSHOT_BLOCO = 256 * 1024
+SNAPSHOT_INTERVALO_MS = 30 * 60 * 1000
+_SO_CRESCEM = re.compile(r"(progresso_\d+\.csv|alteracoes\.jsonl|indice_relatorios\.csv)$")
+_snapshot_lock = threading.Lock()
+
+def _caminho_objeto(h):
+    return os.path.join(SNAPSHOTS_DIR, "objetos", h[:2], h + ".z")
+
+def _gravar_bloco(dados):
+    h = hashlib.sha256(dados).hexdigest()
+    caminho = _caminho_objeto(h)
+    if not os.path.exists(caminho):
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        tmp = caminho + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(zlib.compress(dados, 6))
+        os.replace(tmp, caminho)
+    return h
+
+def _arquivos_para_snapshot():
+    pasta_snap = os.path.abspath(SNAPSHOTS_DIR)
+    for raiz, pastas, arquivos in os.walk(DATA_DIR):
+        pastas[:] = [p for p in pastas if os.path.abspath(os.path.join(raiz, p)) != pasta_snap]
+        for nome in arquivos:
+            if nome.endswith(".tmp") or os.path.join(raiz, nome) == SHARDS_LOCK_FILE:
+                continue
+            caminho = os.path.join(raiz, nome)
+            yield os.path.relpath(caminho, DATA_DIR).replace(os.sep, "/"), caminho
+
+def listar_snapshots():
+    try:
+        nomes = os.listdir(SNAPSHOTS_DIR)
+    except FileNotFoundError:
+        return []
+    return sorted(n[:-5] for n in nomes if n.endswith(".json"))
+
+def _ler_manifesto(snap_id):
+    with open(os.path.join(SNAPSHOTS_DIR, snap_id + ".json"), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def _blocos_do_arquivo(caminho, anterior):
+    st = os.stat(caminho)
+    tamanho = st.st_size
+    if anterior and anterior.get("ino") == st.st_ino:
+        if anterior["tamanho"] == tamanho and anterior["mtime"] == st.st_mtime_ns:
+            return anterior["blocos"], st  # não mudou
+        if _SO_CRESCEM.search(caminho) and tamanho >= anterior["tamanho"] and anterior["blocos"]:
+            # só cresceu: reaproveita os blocos completos e lê a partir do último bloco
+            completos = anterior["tamanho"] // SNAPSHOT_BLOCO
+            blocos = anterior["blocos"][:completos]
+            inicio = completos * SNAPSHOT_BLOCO
+            with open(caminho, "rb") as f:
+                f.seek(inicio)
+                while inicio < tamanho:
+                    dados = f.read(min(SNAPSHOT_BLOCO, tamanho - inicio))
+                    if not dados:
+                        break
+                    blocos.append(_gravar_bloco(dados))
+                    inicio += len(dados)
+            return blocos, st
+    blocos = []
+    with open(caminho, "rb") as f:
+        lido = 0
+        while lido < tamanho:
+            dados = f.read(min(SNAPSHOT_BLOCO, tamanho - lido))
+            if not dados:
+                break
+            blocos.append(_gravar_bloco(dados))
+            lido += len(dados)
+    return blocos, st
+
+def tirar_snapshot(rotulo=""):
+    """Cria um snapshot de data/ e retorna o id dele."""
+    with _snapshot_lock:
+        os.makedirs(SNAPSHOTS_DIR, exist_ok=True)
+        existentes = listar_snapshots()
+        anterior = _ler_manifesto(existentes[-1])["arquivos"] if existentes else {}
+        arquivos = {}
+        for rel, caminho in _arquivos_para_snapshot():
+            try:
+                if rel.startswith("shards/") and "/users_" in rel:
+                    with _USERS_LOCK:  # users são regravados por inteiro: lê fora de uma gravação
+                        blocos, st = _blocos_do_arquivo(caminho, anterior.get(rel))
+                else:
+                    blocos, st = _blocos_do_arquivo(caminho, anterior.get(rel))
+            except FileNotFoundError:
+                continue  # apagado durante o snapshot
+            arquivos[rel] = {"tamanho": st.st_size, "mtime": st.st_mtime_ns,
+                             "ino": st.st_ino, "blocos": blocos}
+        snap_id = datetime.datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        if rotulo:
+            snap_id += "-" + re.sub(r"[^a-z0-9]+", "-", rotulo.lower())
+        manifesto = {"id": snap_id, "criado_em": datetime.datetime.now().isoformat(timespec="seconds"),
+                     "arquivos": arquivos}
+        tmp = os.path.join(SNAPSHOTS_DIR, snap_id + ".json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifesto, f)
+        os.replace(tmp, os.path.join(SNAPSHOTS_DIR, snap_id + ".json"))
+        return snap_id
+
+def tirar_snapshot_em_segundo_plano():
+    """Dispara um snapshot numa thread; não faz nada se já houver um em andamento."""
+    if _snapshot_lock.locked():
+        return None
+    t = threading.Thread(target=tirar_snapshot, daemon=True)
+    t.start()
+    return t
+
+def restaurar_snapshot(snap_id):
+    """
+    Restaura data/ para o snapshot indicado (com o app fechado). Antes, tira um snapshot do
+    estado atual, para que a restauração também possa ser desfeita.
+    """
+    manifesto = _ler_manifesto(snap_id)
+    tirar_snapshot("antes de restaurar")
+    for rel, info in manifesto["arquivos"].items():
+        destino = os.path.join(DATA_DIR, *rel.split("/"))
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        tmp = destino + ".tmp"
+        with open(tmp, "wb") as f:
+            for h in info["blocos"]:
+                with open(_caminho_objeto(h), "rb") as obj:
+                    f.write(zlib.decompress(obj.read()))
+        os.replace(tmp, destino)
+    # arquivos criados depois do snapshot não fazem parte daquele momento
+    for rel, caminho in list(_arquivos_para_snapshot()):
+        if rel not in manifesto["arquivos"]:
+            os.remove(caminho)
 
 # ---------- UI helper: hover / card -------------
 def with_hover(widget, enter_bg=None, leave_bg=None):
@@ -224,12 +2244,14 @@ def with_hover(widget, enter_bg=None, leave_bg=None):
 
 # ------------- Classe principal (UI) -------------
 class GreenPlusPro:
-    def __init__(self, root: tk.Tk):
+    def __init__(self, root: tk.Tk, sincronizador=None):
         self.root = root
+        self.sincronizador = sincronizador
+        self._versao_sync = 0
         self.root.title("Green+")
         self.root.geometry("1180x760")
         self.root.minsize(1000, 640)
-        self.usuario = None
+        self.sessao = None
 
         #  paleta atualizada (tons suaves, profissional)
         self.colors = {
@@ -246,6 +2268,13 @@ class GreenPlusPro:
         self._setup_styles()
         self._create_layout()
         self.show_login()
+        if self.sincronizador:
+            self.root.after(2000, self._verificar_sync)
+        self.root.after(SNAPSHOT_INTERVALO_MS, self._snapshot_periodico)
+
+    @property
+    def usuario(self):
+        return self.sessao.usuario if self.sessao else None
 
     def _setup_styles(self):
         s = self.style
@@ -294,8 +2323,10 @@ class GreenPlusPro:
             ("Calendário", self.show_calendar, "📅"),
             ("Histórico", self.show_history, "📖"),
             ("Ranking", self.show_ranking, "🏆"),
+            ("Equipes", self.show_teams, "👥"),
             ("Conquistas", self.show_achievements, "⭐"),
             ("Minhas Recompensas", self.show_my_rewards, "✨"),  # <-- ADICIONADO AQUI
+            ("Buscar Relatórios", self.show_report_search, "🔎"),
             ("Perfil", self.show_profile, "👤"),
             ("Sair", self.logout, "🚪"),
         ]
@@ -324,12 +2355,9 @@ class GreenPlusPro:
         ttk.Label(self.topbar_left, text="Green+", style="Header.TLabel").pack(side=tk.LEFT, padx=(6,12))
 
         if self.usuario:
-            ttk.Label(self.topbar_right, text=f"👋 {self.usuario['nome']}", font=("Segoe UI", 11), background=self.colors['topbar']).pack(side=tk.LEFT, padx=10)
-            try:
-                pontos = int(self.usuario["pontos"])
-            except:
-                pontos = 0
-            nivel = self.usuario.get("nivel","Básico")
+            ttk.Label(self.topbar_right, text=f"👋 {self.usuario.nome}", font=("Segoe UI", 11), background=self.colors['topbar']).pack(side=tk.LEFT, padx=10)
+            pontos = self.usuario.pontos
+            nivel = self.usuario.nivel
             ttk.Label(self.topbar_right, text=f"{nivel}  •  {pontos} pts", font=("Segoe UI", 11, "bold"), background=self.colors['topbar']).pack(side=tk.LEFT, padx=10)
 
             # barra de progresso até o próximo nível
@@ -348,7 +2376,7 @@ class GreenPlusPro:
 
     # LOGIN / REGISTRO
     def show_login(self):
-        self.usuario = None
+        self.sessao = None
         self._update_topbar()
         self.clear_body()
         frame = tk.Frame(self.body, bg=self.colors["bg"])
@@ -375,15 +2403,16 @@ class GreenPlusPro:
             if not e or not s:
                 messagebox.showerror("Erro", "Preencha email e senha")
                 return
-            users = carregar_usuarios()
+            users = carregar_usuarios(e)
             u = users.get(e)
-            if not u or u["senha"] != md5(s):
+            if not u or u.senha != md5(s):
                 messagebox.showerror("Erro", "Email ou senha inválidos")
                 return
-            self.usuario = u
-            users[e]["ultimo_login"] = str(datetime.date.today())
-            salvar_usuarios_dict(users)
-            messagebox.showinfo("Bem-vindo", f"Olá, {u['nome']}! Bem-vindo ao Green+.")
+            # o carimbo de login é gravado em lote, em segundo plano
+            registro_logins.registrar(e, str(datetime.date.today()))
+            u.ultimo_login = str(datetime.date.today())
+            self.sessao = Sessao(u)
+            messagebox.showinfo("Bem-vindo", f"Olá, {u.nome}! Bem-vindo ao Green+.")
             self._update_topbar()
             self.show_dashboard()
 
@@ -428,21 +2457,16 @@ class GreenPlusPro:
             if senha != conf:
                 messagebox.showerror("Erro", "As senhas não coincidem.")
                 return
-            users = carregar_usuarios()
-            if email in users:
+            with _USERS_LOCK:
+                users = carregar_usuarios(email)
+                existe = email in users
+                if not existe:
+                    users[email] = Usuario(email, md5(senha), nome, ultimo_login=str(datetime.date.today()))
+                    salvar_usuarios_dict(users)
+                    registrar_alteracao("usuario_novo", {"email": email, "senha": users[email].senha, "nome": nome})
+            if existe:
                 messagebox.showerror("Erro", "Este email já está cadastrado.")
                 return
-            users[email] = {
-                "email": email,
-                "senha": md5(senha),
-                "nome": nome,
-                "pontos": "0",
-                "nivel": "Básico",
-                "ultimo_login": str(datetime.date.today()),
-                "badges": "",
-                "rewards": ""
-            }
-            salvar_usuarios_dict(users)
             messagebox.showinfo("Sucesso", "Conta criada! Faça login.")
             self.show_login()
 
@@ -494,9 +2518,9 @@ class GreenPlusPro:
                 ttk.Label(c, text=subtitle, style="Muted.TLabel").pack(anchor="w", padx=14, pady=(0,12))
             return c
 
-        pontos = int(self.usuario.get("pontos","0"))
-        nivel = self.usuario.get("nivel","Básico")
-        badges = self.usuario.get("badges","Nenhum")
+        pontos = self.usuario.pontos
+        nivel = self.usuario.nivel
+        badges = ", ".join(self.usuario.badges) or "Nenhum"
         card(top, "⭐ Pontuação", f"{pontos} pts", "Acumule pontos realizando tarefas")
         card(top, "🏷 Nível", nivel, "Progresso atual")
         card(top, "🎖️ Badges", badges, "Conquistas desbloqueadas")
@@ -518,14 +2542,9 @@ class GreenPlusPro:
         days = [(hoje - datetime.timedelta(days=i)) for i in reversed(range(7))]
         labels = [d.strftime("%d %b") for d in days]
         pts_por_dia = {str(d):0 for d in days}
-        try:
-            with open(PROGRESS_FILE, "r", encoding="utf-8") as f:
-                reader = csv.DictReader(f)
-                for r in reader:
-                    if r["email"] == self.usuario["email"] and r["data"] in pts_por_dia:
-                        pts_por_dia[r["data"]] += int(r["pontos"])
-        except FileNotFoundError:
-            pass
+        for _, r in iterar_progresso_usuario(self.usuario.email):
+            if r["data"] in pts_por_dia:
+                pts_por_dia[r["data"]] += int(r["pontos"])
         values = [pts_por_dia[str(d)] for d in days]
         ax.plot(labels, values, marker="o", linewidth=2)
         ax.set_title("Pontos nos últimos 7 dias")
@@ -570,7 +2589,7 @@ class GreenPlusPro:
         right = tk.Frame(content, bg=self.colors["bg"], width=320)
         right.pack(side=tk.RIGHT, fill=tk.Y)
 
-        nivel = self.usuario.get("nivel","Básico")
+        nivel = self.usuario.nivel
         tarefas = obter_tarefas_por_nivel(nivel)
         if not tarefas:
             tk.Label(left, text="Nenhuma tarefa disponível para seu nível.", bg=self.colors["bg"]).pack(pady=20)
@@ -594,22 +2613,30 @@ class GreenPlusPro:
                 if not texto:
                     messagebox.showerror("Erro", "Escreva um relatório da atividade. (Obrigatório)")
                     return
-                if contar_tarefas_dia(self.usuario["email"]) >= 2:
+                if contar_tarefas_dia(self.usuario.email) >= 2:
                     messagebox.showwarning("Limite", "Você já completou 2 tarefas hoje.")
                     return
-                users = carregar_usuarios()
-                u = users[self.usuario["email"]]
-                u["pontos"] = str(int(u["pontos"]) + pontos)
-                novo_nivel = definir_nivel(int(u["pontos"]))
-                if novo_nivel != u["nivel"]:
-                    u["nivel"] = novo_nivel
-                    adicionar_badge(u, novo_nivel)
+                erro = validar_relatorio_novo(self.usuario.email, texto)
+                if erro:
+                    messagebox.showerror("Relatório recusado", erro)
+                    return
+                with _USERS_LOCK:
+                    users = carregar_usuarios(self.usuario.email)
+                    u = users[self.usuario.email]
+                    novo_nivel = creditar_pontos(u, pontos)
+                    salvar_usuarios_dict(users)
+                if novo_nivel:
                     messagebox.showinfo("Parabéns!", f"Você subiu para o nível {novo_nivel}!")
-                salvar_usuarios_dict(users)
-                salvar_progresso(self.usuario["email"], tarefa, pontos, texto)
-                self.usuario = users[self.usuario["email"]]
+                hoje = str(datetime.date.today())
+                salvar_progresso(self.usuario.email, tarefa, pontos, texto, hoje)
+                registrar_alteracao("progresso", {"email": self.usuario.email, "data": hoje, "tarefa": tarefa,
+                                                  "pontos": pontos, "relatorio": texto})
+                conquistas = registrar_conquistas(self.usuario.email)
+                self.sessao.atualizar(carregar_usuarios(self.usuario.email)[self.usuario.email] if conquistas else u)
                 self._update_topbar()
                 messagebox.showinfo("Sucesso", f"Tarefa concluída! +{pontos} pts")
+                if conquistas:
+                    messagebox.showinfo("Nova conquista!", "Você desbloqueou:\n" + "\n".join(conquistas))
                 self.show_dashboard()
             ttk.Button(btnf, text="Concluir", command=concluir, style="Accent.TButton").pack(side=tk.LEFT)
             ttk.Button(btnf, text="Cancelar", command=lambda: self.show_dashboard()).pack(side=tk.LEFT, padx=8)
@@ -619,7 +2646,7 @@ class GreenPlusPro:
         info_card.pack(fill=tk.BOTH, padx=6, pady=6)
         ttk.Label(info_card, text="Como funciona", style="CardHeader.TLabel").pack(anchor="w", padx=12, pady=(8,6))
         tk.Label(info_card, text="1) Escolha uma tarefa.\n2) Escreva um breve relatório (obrigatório).\n3) Clique em Concluir para ganhar pontos.", bg=self.colors["card"], justify="left", wraplength=300).pack(padx=12, pady=6)
-        tk.Label(info_card, text=f"Limite diário: 2 tarefas (Você já completou {contar_tarefas_dia(self.usuario['email'])})", bg=self.colors["card"], font=("Segoe UI", 9, "italic")).pack(anchor="w", padx=12, pady=(6,12))
+        tk.Label(info_card, text=f"Limite diário: 2 tarefas (Você já completou {contar_tarefas_dia(self.usuario.email)})", bg=self.colors["card"], font=("Segoe UI", 9, "italic")).pack(anchor="w", padx=12, pady=(6,12))
 
     # --------------- Calendar ----------------
     def show_calendar(self):
@@ -636,6 +2663,10 @@ class GreenPlusPro:
 
         cal = Calendar(left, selectmode="day")
         cal.pack(padx=6, pady=6)
+        # cores dos dias com atividade, pela soma de pontos no dia
+        cal.tag_config("atv_baixa", background="#c8ecd7", foreground="black")
+        cal.tag_config("atv_media", background=self.colors["accent"], foreground="white")
+        cal.tag_config("atv_alta", background=self.colors["primary"], foreground="white")
 
         lbl = ttk.Label(right, text="Tarefas no dia selecionado", style="SubHeader.TLabel")
         lbl.pack(anchor="w", padx=6, pady=(6,4))
@@ -643,27 +2674,46 @@ class GreenPlusPro:
         listbox = tk.Listbox(right)
         listbox.pack(fill=tk.BOTH, expand=True, padx=6, pady=6)
 
-        def mostrar():
-            sel = cal.get_date()
-            for fmt in ("%m/%d/%y", "%Y-%m-%d", "%d/%m/%Y"):
-                try:
-                    d = datetime.datetime.strptime(sel, fmt).date()
-                    break
-                except Exception:
-                    d = None
+        email = self.usuario.email
+        meses = {}  # (ano, mes) -> {data: [registros]}; uma consulta por mês
+
+        def carregar_mes(ano, mes):
+            if (ano, mes) not in meses:
+                inicio = datetime.date(ano, mes, 1)
+                fim = datetime.date(ano + mes // 12, mes % 12 + 1, 1) - datetime.timedelta(days=1)
+                meses[(ano, mes)] = atividade_no_periodo(email, inicio, fim)
+            return meses[(ano, mes)]
+
+        def vizinhos(ano, mes):
+            anterior = (ano - 1, 12) if mes == 1 else (ano, mes - 1)
+            seguinte = (ano + 1, 1) if mes == 12 else (ano, mes + 1)
+            return anterior, seguinte
+
+        def pintar_mes(event=None):
+            mes, ano = cal.get_displayed_month()
+            cal.calevent_remove("all")
+            for dstr, registros in carregar_mes(ano, mes).items():
+                total = sum(int(r["pontos"]) for r in registros)
+                tag = "atv_baixa" if total < 20 else ("atv_media" if total < 40 else "atv_alta")
+                cal.calevent_create(datetime.date.fromisoformat(dstr), f"{len(registros)} tarefa(s), {total} pts", tag)
+            # deixa os meses vizinhos prontos para a próxima navegação
+            for a, m in vizinhos(ano, mes):
+                self.root.after_idle(carregar_mes, a, m)
+
+        def mostrar(event=None):
+            try:
+                d = cal.selection_get()
+            except Exception:
+                d = None
             if d is None:
                 d = datetime.date.today()
-            dstr = str(d)
             listbox.delete(0, tk.END)
-            try:
-                with open(PROGRESS_FILE, "r", encoding="utf-8") as f:
-                    reader = csv.DictReader(f)
-                    for r in reader:
-                        if r["email"] == self.usuario["email"] and r["data"] == dstr:
-                            listbox.insert(tk.END, f"{r['tarefa']} (+{r['pontos']} pts) - {r['relatorio'][:80]}...")
-            except FileNotFoundError:
-                pass
+            for r in carregar_mes(d.year, d.month).get(str(d), []):
+                listbox.insert(tk.END, f"{r['tarefa']} (+{r['pontos']} pts) - {r['relatorio'][:80]}...")
 
+        cal.bind("<<CalendarMonthChanged>>", pintar_mes)
+        cal.bind("<<CalendarSelected>>", mostrar)
+        pintar_mes()
         ttk.Button(left, text="Mostrar tarefas", command=mostrar).pack(pady=6)
 
     # ------------- Histórico ----------------
@@ -683,14 +2733,10 @@ class GreenPlusPro:
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         tree.configure(yscroll=scrollbar.set)
 
-        try:
-            with open(PROGRESS_FILE, "r", encoding="utf-8") as f:
-                reader = csv.DictReader(f)
-                for r in reader:
-                    if r["email"] == self.usuario["email"]:
-                        tree.insert("", tk.END, values=(r["data"], r["tarefa"], f"+{r['pontos']}", r["relatorio"][:60]+"..."))
-        except FileNotFoundError:
-            pass
+        sinalizados = carregar_sinalizados()
+        for rid, r in iterar_progresso_usuario(self.usuario.email):
+            if rid not in sinalizados:
+                tree.insert("", tk.END, values=(r["data"], r["tarefa"], f"+{r['pontos']}", r["relatorio"][:60]+"..."))
 
     # -------------- Ranking ----------------
     def show_ranking(self):
@@ -700,14 +2746,14 @@ class GreenPlusPro:
         frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=6)
 
         users = list(carregar_usuarios().values())
-        users_sorted = sorted(users, key=lambda u: int(u["pontos"]), reverse=True)[:5]
+        users_sorted = sorted(users, key=lambda u: u.pontos, reverse=True)[:5]
         for idx, u in enumerate(users_sorted, start=1):
             bgc = self.colors["card"]
             card = tk.Frame(frame, bg=bgc, bd=0, relief=tk.RIDGE)
             card.pack(fill=tk.X, padx=6, pady=8)
             medal = "🥇" if idx==1 else ("🥈" if idx==2 else ("🥉" if idx==3 else f"#{idx}"))
-            ttk.Label(card, text=f"{medal}  {u['nome']}", style="CardHeader.TLabel").pack(anchor="w", padx=12, pady=(8,0))
-            tk.Label(card, text=f"Pontos: {u['pontos']}  •  Nível: {u['nivel']}", bg=bgc).pack(anchor="w", padx=12, pady=(0,8))
+            ttk.Label(card, text=f"{medal}  {u.nome}", style="CardHeader.TLabel").pack(anchor="w", padx=12, pady=(8,0))
+            tk.Label(card, text=f"Pontos: {u.pontos}  •  Nível: {u.nivel}", bg=bgc).pack(anchor="w", padx=12, pady=(0,8))
 
         def ver_completo():
             top = tk.Toplevel(self.root)
@@ -718,10 +2764,83 @@ class GreenPlusPro:
             tree.heading("pontos", text="Pontos")
             tree.heading("nivel", text="Nível")
             tree.pack(fill=tk.BOTH, expand=True)
-            for u in sorted(users, key=lambda x: int(x["pontos"]), reverse=True):
-                tree.insert("", tk.END, values=(u["nome"], u["pontos"], u["nivel"]))
+            for u in sorted(users, key=lambda x: x.pontos, reverse=True):
+                tree.insert("", tk.END, values=(u.nome, u.pontos, u.nivel.value))
         ttk.Button(frame, text="Ver ranking completo", command=ver_completo).pack(pady=10)
 
+    # -------------- Ranking de equipes ----------------
+    def show_teams(self):
+        if not self._ensure_user(): return
+        self.clear_body()
+        ttk.Label(self.body, text="Ranking de Equipes", style="Header.TLabel").pack(anchor="w", padx=20, pady=(12,6))
+        barra = tk.Frame(self.body, bg=self.colors["bg"])
+        barra.pack(fill=tk.X, padx=20, pady=(0,6))
+        tk.Label(barra, text="Tipo:", bg=self.colors["bg"]).pack(side=tk.LEFT)
+        tipo_cb = ttk.Combobox(barra, values=("todos",) + TIPOS_GRUPO, state="readonly", width=10)
+        tipo_cb.set("todos")
+        tipo_cb.pack(side=tk.LEFT, padx=(4,12))
+        tk.Label(barra, text="Ordenar por:", bg=self.colors["bg"]).pack(side=tk.LEFT)
+        ordem_cb = ttk.Combobox(barra, values=("total de pontos", "média por membro"), state="readonly", width=16)
+        ordem_cb.set("total de pontos")
+        ordem_cb.pack(side=tk.LEFT, padx=(4,12))
+        meus = ", ".join(g["grupo"] for g in placar_grupos.grupos_do_usuario(self.usuario.email)) or "nenhum"
+        tk.Label(barra, text=f"Seus grupos: {meus}", bg=self.colors["bg"], fg=self.colors["muted"]).pack(side=tk.LEFT, padx=12)
+
+        frame = tk.Frame(self.body, bg=self.colors["bg"])
+        frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=6)
+        cols = ("pos","grupo","tipo","total","media","membros","ativos")
+        grupos_tree = ttk.Treeview(frame, columns=cols, show="headings")
+        for c, titulo in zip(cols, ("#", "Grupo", "Tipo", "Total", "Média", "Membros", "Ativos (30d)")):
+            grupos_tree.heading(c, text=titulo)
+            grupos_tree.column(c, anchor="w", width=200 if c == "grupo" else 80)
+        grupos_tree.pack(fill=tk.BOTH, expand=True, side=tk.LEFT)
+        membros_tree = ttk.Treeview(frame, columns=("pos","nome","pontos"), show="headings")
+        for c, titulo in (("pos", "#"), ("nome", "Membro"), ("pontos", "Pontos")):
+            membros_tree.heading(c, text=titulo)
+            membros_tree.column(c, anchor="w", width=200 if c == "nome" else 60)
+        membros_tree.pack(fill=tk.BOTH, expand=True, side=tk.LEFT, padx=(12,0))
+
+        def atualizar(event=None):
+            grupos_tree.delete(*grupos_tree.get_children())
+            membros_tree.delete(*membros_tree.get_children())
+            tipo = None if tipo_cb.get() == "todos" else tipo_cb.get()
+            por = "total" if ordem_cb.get() == "total de pontos" else "media"
+            for pos, g in enumerate(placar_grupos.top_grupos(50, por, tipo), start=1):
+                grupos_tree.insert("", tk.END, iid=g["grupo"], values=(pos, g["grupo"], g["tipo"], g["total"], g["media"], g["membros"], g["ativos"]))
+
+        def ver_membros(event=None):
+            sel = grupos_tree.selection()
+            if not sel: return
+            membros_tree.delete(*membros_tree.get_children())
+            for pos, (nome, email, pontos) in enumerate(placar_grupos.ranking_do_grupo(sel[0]), start=1):
+                membros_tree.insert("", tk.END, values=(pos, nome, pontos))
+
+        tipo_cb.bind("<<ComboboxSelected>>", atualizar)
+        ordem_cb.bind("<<ComboboxSelected>>", atualizar)
+        grupos_tree.bind("<<TreeviewSelect>>", ver_membros)
+
+        entrar_f = tk.Frame(self.body, bg=self.colors["bg"])
+        entrar_f.pack(fill=tk.X, padx=20, pady=(6,12))
+        tk.Label(entrar_f, text="Entrar em um grupo:", bg=self.colors["bg"]).pack(side=tk.LEFT)
+        grupo_e = ttk.Entry(entrar_f, width=30)
+        grupo_e.pack(side=tk.LEFT, padx=(4,8))
+        novo_tipo_cb = ttk.Combobox(entrar_f, values=TIPOS_GRUPO, state="readonly", width=10)
+        novo_tipo_cb.set("turma")
+        novo_tipo_cb.pack(side=tk.LEFT, padx=(0,8))
+
+        def entrar():
+            grupo = grupo_e.get().strip()
+            if not grupo:
+                messagebox.showerror("Erro", "Informe o nome do grupo.")
+                return
+            if not entrar_no_grupo(self.usuario.email, grupo, novo_tipo_cb.get()):
+                messagebox.showinfo("Equipes", "Você já faz parte desse grupo.")
+                return
+            messagebox.showinfo("Equipes", f"Você entrou no grupo {grupo}!")
+            self.show_teams()
+        ttk.Button(entrar_f, text="Entrar", command=entrar, style="Accent.TButton").pack(side=tk.LEFT)
+        atualizar()
+
     # -------------- Achievements / Conquistas ----------------
     def show_achievements(self):
         """
@@ -742,14 +2861,14 @@ class GreenPlusPro:
         top = tk.Frame(frame, bg=self.colors["bg"]) 
         top.pack(fill=tk.X, pady=(0,8))
         ttk.Label(top, text="Suas Badges", style="SubHeader.TLabel").pack(anchor="w")
-        badges_text = self.usuario.get("badges","")
+        badges = self.usuario.badges
         bframe = tk.Frame(top, bg=self.colors["bg"]) 
         bframe.pack(fill=tk.X, pady=(6,8))
-        if not badges_text:
+        if not badges:
             tk.Label(bframe, text="Nenhuma conquista ainda. Realize tarefas para ganhar badges!", bg=self.colors["bg"]).pack(pady=4)
         else:
-            for b in badges_text.split(","):
-                lbl = tk.Label(bframe, text=b.strip(), bg=self.colors["card"], font=("Segoe UI", 11), bd=0, relief=tk.RIDGE, padx=8, pady=6)
+            for b in badges:
+                lbl = tk.Label(bframe, text=b, bg=self.colors["card"], font=("Segoe UI", 11), bd=0, relief=tk.RIDGE, padx=8, pady=6)
                 lbl.pack(side=tk.LEFT, padx=6)
 
         # Recompensas disponíveis (catálogo público)
@@ -760,6 +2879,9 @@ class GreenPlusPro:
         rewards = carregar_recompensas()
         nivel_ord = {"Básico":0, "Intermediário":1, "Avançado":2}
         rewards_sorted = sorted(rewards, key=lambda r: (nivel_ord.get(r["nivel"],0), r["custo_pontos"]))
+        u = self.usuario
+        user_pontos = u.pontos
+        user_ordem = u.nivel.ordem
 
         for r in rewards_sorted:
             card = tk.Frame(catalog, bg=self.colors["card"], bd=0, relief=tk.RIDGE)
@@ -773,15 +2895,17 @@ class GreenPlusPro:
             tk.Label(left, text=f"{r['descricao']}", bg=self.colors["card"], wraplength=720, justify="left").pack(anchor="w", pady=(4,6))
             tk.Label(left, text=f"Custo: {r['custo_pontos']} pts", bg=self.colors["card"], font=("Segoe UI", 10, "bold")).pack(anchor="w")
 
-            u = self.usuario
-            user_pontos = int(u.get("pontos","0"))
-            user_nivel = u.get("nivel","Básico")
-            niveis_ordem = {"Básico": 0, "Intermediário": 1, "Avançado": 2}
-            nivel_req_ok = niveis_ordem.get(user_nivel,0) >= niveis_ordem.get(r["nivel"],0)
+            restante = motor_resgates.restante(r)
+            if restante is not None:
+                tk.Label(left, text=f"Estoque: {restante} de {r['estoque']}", bg=self.colors["card"], fg=self.colors["muted"]).pack(anchor="w")
+
+            nivel_req_ok = user_ordem >= nivel_ord.get(r["nivel"],0)
             ja_resgatada = usuario_tem_resgatado(u, r["id"])
             if ja_resgatada:
                 ttk.Label(right, text="✔️ Resgatada", style="CardHeader.TLabel").pack(anchor="e")
                 tk.Label(right, text=f"Resgatada", bg=self.colors["card"]).pack(anchor="e")
+            elif restante == 0:
+                tk.Label(right, text="Esgotado", bg=self.colors["card"], fg=self.colors["muted"]).pack(anchor="e")
             else:
                 if nivel_req_ok:
                     if user_pontos >= r["custo_pontos"]:
@@ -795,22 +2919,23 @@ class GreenPlusPro:
         ttk.Label(frame, text="Recompensas que você resgatou", style="SubHeader.TLabel").pack(anchor="w", pady=(12,4))
         rframe = tk.Frame(frame, bg=self.colors["bg"]) 
         rframe.pack(fill=tk.X, pady=(0,12))
-        claimed = self.usuario.get("rewards","")
+        claimed = self.usuario.rewards
         if not claimed:
             tk.Label(rframe, text="Nenhuma recompensa resgatada ainda.", bg=self.colors["bg"]).pack(anchor="w")
         else:
-            ids = [i for i in claimed.split(";") if i]
-            for rid in ids:
+            for rid in claimed:
                 rec = obter_recompensa_por_id(rid)
                 if rec:
                     tk.Label(rframe, text=f"• {rec['titulo']} ({rec['nivel']})", bg=self.colors["bg"]).pack(anchor="w")
 
     def _handle_resgatar(self, reward_id):
-        ok, msg = resgatar_recompensa_para_usuario(self.usuario["email"], reward_id)
+        try:
+            ok, msg = resgatar_recompensa_para_usuario(self.usuario.email, reward_id)
+        except Exception as exc:  # ex.: arquivo de dados aberto em outro programa
+            messagebox.showerror("Resgate", f"Não foi possível concluir o resgate agora: {exc}")
+            return
         if ok:
-            users = carregar_usuarios()
-            self.usuario = users[self.usuario["email"]]
-            salvar_usuarios_dict(users)
+            self.sessao.atualizar(carregar_usuarios(self.sessao.email)[self.sessao.email])
             self._update_topbar()
             messagebox.showinfo("Resgate", msg)
             self.show_my_rewards()  # <-- agora abre a tela Minhas Recompensas
@@ -833,6 +2958,61 @@ class GreenPlusPro:
             ttk.Label(card, text=f"{r['titulo']}  ({r['nivel']}) - {r['custo_pontos']} pts", style="CardHeader.TLabel").pack(anchor="w", padx=12, pady=8)
             tk.Label(card, text=r["descricao"], bg=self.colors["card"], wraplength=900, justify="left").pack(anchor="w", padx=12, pady=(0,8))
 
+    # -------------- Busca de relatórios (moderação) ----------------
+    def show_report_search(self):
+        if not self._ensure_user(): return
+        if not eh_moderador(self.usuario.email):
+            messagebox.showwarning("Atenção", "Área restrita aos moderadores.")
+            return
+        self.clear_body()
+        ttk.Label(self.body, text="Buscar Relatórios", style="Header.TLabel").pack(anchor="w", padx=20, pady=(12,6))
+        barra = tk.Frame(self.body, bg=self.colors["bg"])
+        barra.pack(fill=tk.X, padx=20, pady=(0,6))
+        consulta_e = ttk.Entry(barra, width=60)
+        consulta_e.pack(side=tk.LEFT, padx=(0,8))
+        status = tk.Label(barra, text="Use * no fim de um termo para buscar por prefixo (ex.: banh*)", bg=self.colors["bg"], fg=self.colors["muted"])
+
+        frame = tk.Frame(self.body, bg=self.colors["bg"])
+        frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=6)
+        cols = ("email","data","tarefa","pontos","relatorio","sinalizado")
+        tree = ttk.Treeview(frame, columns=cols, show="headings")
+        for c in cols:
+            tree.heading(c, text=c.capitalize())
+            tree.column(c, anchor="w", width=260 if c in ("relatorio", "sinalizado") else 140)
+        tree.pack(fill=tk.BOTH, expand=True, side=tk.LEFT)
+        scrollbar = ttk.Scrollbar(frame, command=tree.yview)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        tree.configure(yscroll=scrollbar.set)
+
+        def buscar(event=None):
+            consulta = consulta_e.get().strip()
+            tree.delete(*tree.get_children())
+            if not consulta:
+                return
+            resultados = buscar_relatorios(consulta)
+            sinalizados = carregar_sinalizados()
+            for off, r in resultados:
+                tree.insert("", tk.END, values=(r["email"], r["data"], r["tarefa"], f"+{r['pontos']}", r["relatorio"], sinalizados.get(off, "")))
+            status.configure(text=f"{len(resultados)} relatório(s) encontrado(s)")
+
+        def exportar_analytics():
+            # roda em segundo plano para não travar a janela; o aviso volta pela thread da UI
+            def tarefa():
+                try:
+                    gerar_analytics()
+                    msg = (messagebox.showinfo, "Analytics", f"Relatórios exportados em {ANALYTICS_DIR}")
+                except Exception as exc:
+                    msg = (messagebox.showerror, "Analytics", f"Falha ao gerar analytics: {exc}")
+                self.root.after(0, lambda: msg[0](msg[1], msg[2]))
+            threading.Thread(target=tarefa, daemon=True).start()
+            status.configure(text="Gerando analytics...")
+
+        consulta_e.bind("<Return>", buscar)
+        ttk.Button(barra, text="Buscar", command=buscar, style="Accent.TButton").pack(side=tk.LEFT)
+        ttk.Button(barra, text="Exportar analytics", command=exportar_analytics).pack(side=tk.LEFT, padx=(8,0))
+        status.pack(side=tk.LEFT, padx=12)
+        consulta_e.focus_set()
+
     # -------------- Perfil ----------------
     def show_profile(self):
         if not self._ensure_user(): return
@@ -843,12 +3023,12 @@ class GreenPlusPro:
         card = tk.Frame(frame, bg=self.colors["card"]) 
         card.pack(fill=tk.X, padx=6, pady=6)
 
-        tk.Label(card, text=f"Nome: {self.usuario['nome']}", bg=self.colors["card"], font=("Segoe UI", 12)).pack(anchor="w", padx=12, pady=(10,4))
-        tk.Label(card, text=f"Email: {self.usuario['email']}", bg=self.colors["card"], font=("Segoe UI", 11)).pack(anchor="w", padx=12, pady=(0,6))
-        tk.Label(card, text=f"Nível: {self.usuario['nivel']}  •  Pontos: {self.usuario['pontos']}", bg=self.colors["card"], font=("Segoe UI", 11)).pack(anchor="w", padx=12, pady=(0,6))
+        tk.Label(card, text=f"Nome: {self.usuario.nome}", bg=self.colors["card"], font=("Segoe UI", 12)).pack(anchor="w", padx=12, pady=(10,4))
+        tk.Label(card, text=f"Email: {self.usuario.email}", bg=self.colors["card"], font=("Segoe UI", 11)).pack(anchor="w", padx=12, pady=(0,6))
+        tk.Label(card, text=f"Nível: {self.usuario.nivel}  •  Pontos: {self.usuario.pontos}", bg=self.colors["card"], font=("Segoe UI", 11)).pack(anchor="w", padx=12, pady=(0,6))
 
-        tk.Label(card, text=f"Badges: {self.usuario.get('badges','Nenhuma')}", bg=self.colors["card"], font=("Segoe UI", 11)).pack(anchor="w", padx=12, pady=(0,6))
-        tk.Label(card, text=f"Recompensas resgatadas: {self.usuario.get('rewards','Nenhuma')}", bg=self.colors["card"], font=("Segoe UI", 10)).pack(anchor="w", padx=12, pady=(0,10))
+        tk.Label(card, text=f"Badges: {', '.join(self.usuario.badges) or 'Nenhuma'}", bg=self.colors["card"], font=("Segoe UI", 11)).pack(anchor="w", padx=12, pady=(0,6))
+        tk.Label(card, text=f"Recompensas resgatadas: {', '.join(self.usuario.rewards) or 'Nenhuma'}", bg=self.colors["card"], font=("Segoe UI", 10)).pack(anchor="w", padx=12, pady=(0,10))
 
         def alterar_senha():
             top = tk.Toplevel(self.root)
@@ -863,16 +3043,20 @@ class GreenPlusPro:
                 atual = s_atual.get().strip()
                 nova = s_nova.get().strip()
                 conf = s_conf.get().strip()
-                users = carregar_usuarios()
-                u = users[self.usuario["email"]]
-                if md5(atual) != u["senha"]:
-                    messagebox.showerror("Erro", "Senha atual incorreta.")
-                    return
                 if nova != conf:
                     messagebox.showerror("Erro", "As senhas não coincidem.")
                     return
-                u["senha"] = md5(nova)
-                salvar_usuarios_dict(users)
+                with _USERS_LOCK:
+                    users = carregar_usuarios(self.usuario.email)
+                    u = users[self.usuario.email]
+                    senha_ok = md5(atual) == u.senha
+                    if senha_ok:
+                        u.senha = md5(nova)
+                        salvar_usuarios_dict(users)
+                        registrar_alteracao("senha", {"email": u.email, "senha": u.senha, "anterior": md5(atual)})
+                if not senha_ok:
+                    messagebox.showerror("Erro", "Senha atual incorreta.")
+                    return
                 messagebox.showinfo("Sucesso", "Senha alterada.")
                 top.destroy()
             ttk.Button(top, text="Salvar", command=salvar).grid(row=3, column=1, pady=8)
@@ -887,8 +3071,24 @@ class GreenPlusPro:
             return False
         return True
 
+    def _verificar_sync(self):
+        # a sincronização roda em outra thread; aqui só atualizamos a sessão quando algo chegou
+        if self.sincronizador.versao != self._versao_sync:
+            self._versao_sync = self.sincronizador.versao
+            if self.sessao:
+                u = carregar_usuarios(self.sessao.email).get(self.sessao.email)
+                if u:
+                    self.sessao.atualizar(u)
+                    self._update_topbar()
+        self.root.after(2000, self._verificar_sync)
+
+    def _snapshot_periodico(self):
+        # o snapshot roda numa thread; a janela continua respondendo
+        tirar_snapshot_em_segundo_plano()
+        self.root.after(SNAPSHOT_INTERVALO_MS, self._snapshot_periodico)
+
     def logout(self):
-        self.usuario = None
+        self.sessao = None
         messagebox.showinfo("Sessão", "Você saiu do sistema.")
         self.show_login()
 
@@ -901,14 +3101,13 @@ class GreenPlusPro:
         self.clear_body()
         ttk.Label(self.body, text="🎖️ Minhas Recompensas", style="Header.TLabel").pack(anchor="center", pady=(12,8))
         frame = self._create_scrollable_area(self.body)
-        claimed = self.usuario.get("rewards", "")
+        claimed = self.usuario.rewards
         if not claimed:
             tk.Label(frame, text="Você ainda não resgatou nenhuma recompensa.", bg=self.colors["bg"], font=("Segoe UI", 11)).pack(pady=20)
             return
 
-        ids = [i for i in claimed.split(";") if i]
         rewards = []
-        for rid in ids:
+        for rid in claimed:
             rec = obter_recompensa_por_id(rid)
             if rec:
                 rewards.append(rec)
@@ -926,6 +3125,40 @@ class GreenPlusPro:
 
 # -------------- Run app -------------
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--analisar-relatorios":
+        processos = int(sys.argv[2]) if len(sys.argv) > 2 else None
+        total = analisar_relatorios(processos)
+        print(f"{total} relatório(s) sinalizado(s) em {FLAGS_FILE}")
+        sys.exit(0)
+    if len(sys.argv) > 2 and sys.argv[1] == "--resharding":
+        config = reshardear(int(sys.argv[2]))
+        print(f"Dados redistribuídos em {config['n']} shards (geração {config['geracao']})")
+        sys.exit(0)
+    if len(sys.argv) > 1 and sys.argv[1] == "--snapshot":
+        print(f"Snapshot criado: {tirar_snapshot()}")
+        sys.exit(0)
+    if len(sys.argv) > 1 and sys.argv[1] == "--listar-snapshots":
+        print("\n".join(listar_snapshots()) or "Nenhum snapshot.")
+        sys.exit(0)
+    if len(sys.argv) > 2 and sys.argv[1] == "--restaurar":
+        restaurar_snapshot(sys.argv[2])
+        print(f"data/ restaurado para o snapshot {sys.argv[2]}")
+        sys.exit(0)
+    if len(sys.argv) > 1 and sys.argv[1] == "--servidor-sync":
+        porta = int(sys.argv[2]) if len(sys.argv) > 2 else 8765
+        servir_sincronizacao(porta, sys.argv[3] if len(sys.argv) > 3 else "servidor_sync")
+        sys.exit(0)
+    if len(sys.argv) > 1 and sys.argv[1] == "--reconstruir-conquistas":
+        processos = int(sys.argv[2]) if len(sys.argv) > 2 else None
+        print(f"{reconstruir_conquistas(processos)} conquistas desbloqueadas no histórico")
+        sys.exit(0)
+    if len(sys.argv) > 1 and sys.argv[1] == "--analytics":
+        processos = int(sys.argv[2]) if len(sys.argv) > 2 else None
+        resumo = gerar_analytics(processos)
+        print(f"Analytics exportado em {ANALYTICS_DIR} (meses recalculados: {', '.join(resumo['meses_recalculados']) or 'nenhum'})")
+        sys.exit(0)
+    sincronizador = iniciar_sincronizacao()
+    carregar_indice_em_segundo_plano()
     root = tk.Tk()
-    app = GreenPlusPro(root)
+    app = GreenPlusPro(root, sincronizador)
     root.mainloop()
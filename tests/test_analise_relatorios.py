@@ -0,0 +1,56 @@
+import importlib.util
+import multiprocessing
+import os
+import sys
+import tempfile
+import unittest
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "APS_Codigos", "APS_Projeto Green+.py")
+
+
+def carregar_app():
+    # o app usa data/ relativo ao diretório atual: o teste roda numa pasta temporária
+    spec = importlib.util.spec_from_file_location("greenplus_app", APP)
+    app = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = app  # o Pool da análise precisa achar as funções pelo nome do módulo
+    spec.loader.exec_module(app)
+    return app
+
+
+@unittest.skipUnless(importlib.util.find_spec("tkcalendar") and importlib.util.find_spec("matplotlib"),
+                     "dependências da interface não instaladas")
+@unittest.skipUnless(multiprocessing.get_start_method() == "fork", "a análise usa Pool com fork")
+class DuplicadosEntreShardsTest(unittest.TestCase):
+    def setUp(self):
+        self._cwd = os.getcwd()
+        self._tmp = tempfile.TemporaryDirectory()
+        os.chdir(self._tmp.name)
+        self.app = carregar_app()
+
+    def tearDown(self):
+        sys.modules.pop("greenplus_app", None)
+        os.chdir(self._cwd)
+        self._tmp.cleanup()
+
+    def test_original_mais_antigo_em_shard_maior_nao_e_sinalizado(self):
+        app = self.app
+        por_shard = {}
+        i = 0
+        while len(por_shard) < app._config_shards()["n"]:
+            email = f"usuario{i}@teste.com"
+            por_shard.setdefault(app.shard_de(email), email)
+            i += 1
+        autor, copiador = por_shard[max(por_shard)], por_shard[0]
+        texto = "Separei papel plástico e vidro da cozinha e levei tudo ao ponto de coleta do bairro"
+        app.salvar_progresso(autor, "Coleta Seletiva", 10, texto, "2025-01-01")
+        app.salvar_progresso(copiador, "Coleta Seletiva", 10, texto, "2025-02-01")
+
+        app.analisar_relatorios(1)
+        sinalizados = app.carregar_sinalizados()
+        ids = {r["email"]: rid for rid, r in app.iterar_progresso()}
+        self.assertNotIn(ids[autor], sinalizados)
+        self.assertIn("texto repetido entre contas", sinalizados[ids[copiador]])
+
+
+if __name__ == "__main__":
+    unittest.main()